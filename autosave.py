@@ -0,0 +1,44 @@
+import sys
+import threading
+
+
+class AutosaveWorker(threading.Thread):
+    """
+    A background thread that saves whatever has changed, at most once per
+    interval, so that a long session isn't only saved when it ends. Saving
+    holds the command parser's lock, so it never overlaps a command, and a
+    command entered while a save is being written waits for it to finish. A
+    save that fails is reported and tried again after the next interval.
+
+    Args:
+        command_parser (CommandParser): the parser whose managers to save
+
+        interval (float): the number of seconds between saves
+    """
+
+    def __init__(self, command_parser, interval):
+        super().__init__(name='autosave', daemon=True)
+        self.command_parser = command_parser
+        self.interval = interval
+        self.stopping = threading.Event()
+
+    def run(self):
+        while not self.stopping.wait(self.interval):
+            with self.command_parser.lock:
+                # The worker may have been stopped while waiting for the lock
+                if self.stopping.is_set():
+                    return None
+
+                try:
+                    self.command_parser.autosave()
+                except Exception as err:
+                    # Whatever didn't save is still marked as changed
+                    print("Autosave failed: {}".format(err), file=sys.stderr)
+
+    def stop(self):
+        """
+        Stops the worker and waits for any save in progress to finish. Must
+        not be called with the command parser's lock held.
+        """
+        self.stopping.set()
+        self.join()
\ No newline at end of file
@@ -1,10 +1,91 @@
+import bisect
+import re
 import traceback
 import sys
+from instrumentation import hooks
+
+# A word of a command line, the unit commands and their arguments are made of
+WORD = re.compile(r'\S+')
+
+class CommandError(Exception):
+    """
+    Raised when a command fails and the handler has been asked to raise
+    errors rather than print them, as in batch mode with --stop-on-error
+    """
+
+class CommandLine():
+    """
+    A command line split into words once, so that a chain of commands can be
+    worked through one word at a time without splitting the line again
+    
+    Args:
+        text (str): the command line
+    """
+    
+    def __init__(self, text):
+        self.text = text
+        self.spans = [match.span() for match in WORD.finditer(text)]
+        self.starts = [start for start, end in self.spans]
+        self.position = 0
+        
+    def head(self):
+        """
+        Returns the word at the current position, which names a command, or
+        an empty string if there are no words left
+        """
+        if self.position >= len(self.spans):
+            return ''
+            
+        start, end = self.spans[self.position]
+        return self.text[start:end]
+        
+    def remainder(self):
+        """
+        Returns the rest of the line after the current word, which is the
+        command's arguments followed by any commands chained after it
+        """
+        if self.position + 1 >= len(self.spans):
+            return ''
+            
+        return self.text[self.spans[self.position + 1][0]:]
+        
+    def advance(self):
+        """
+        Moves on to the next word
+        """
+        self.position += 1
+        
+    def skip_to(self, rest):
+        """
+        Moves on to the word that rest starts with, when rest is the end of
+        this line from the start of one of its words, as left over by a
+        command that used some of its arguments
+        
+        Args:
+            rest (str): what a command left of the line
+            
+        Returns:
+            bool: whether rest was found in the line
+        """
+        start = len(self.text) - len(rest)
+        position = bisect.bisect_left(self.starts, start)
+        
+        if (position < len(self.starts) and self.starts[position] == start
+                and self.text.endswith(rest)):
+            self.position = position
+            return True
+            
+        return False
 
 class BaseCommandHandler():
     """
     Base class for all Command Handlers
     """    
+    # Whether a failed command raises a CommandError instead of printing
+    raise_errors = False
+    
+    # The mode this handler serves, which its commands are timed under
+    mode = None
     
     def __init__(self):
         self.switcher = {}
@@ -19,22 +100,51 @@ class BaseCommandHandler():
         Returns:
             str: the remaining command that wasn't consumed
         """
-        try:
-            initial_command, remainder = command.split(maxsplit=1)
-        except ValueError:
-            # Happens when the command can't be split
-            initial_command = command
-            remainder = ''
+        command_line = CommandLine(command)
+        
+        return self.dispatch(command_line.head(), command_line.remainder())
         
+    def dispatch(self, initial_command, remainder):
+        """
+        Dispatches a command that has already been split from its arguments
+        
+        Args:
+            initial_command (str): the name of the command
+            
+            remainder (str): the rest of the command line
+            
+        Returns:
+            str: the remaining command that wasn't consumed
+        """
         try:
             handling_result = self.switcher[initial_command]
-            remainder = handling_result(remainder)
+            remainder = hooks.timed('command', self.mode, initial_command,
+                                    handling_result, remainder)
         except KeyError:
+            if self.raise_errors:
+                raise CommandError("Command not found: " + initial_command)
+                
             print("Command not found") 
-        except StopIteration:
+        except (StopIteration, CommandError):
             raise
         except BaseException as err:
+            if self.raise_errors:
+                raise CommandError("That caused an exception: {}".format(err))
+                
             print("That caused an exception: {}".format(err))
             traceback.print_exc(file=sys.stdout)
         
-        return remainder
\ No newline at end of file
+        return remainder
+        
+    def get_managers(self):
+        """
+        Returns the managers whose data this handler loads and saves
+        """
+        return []
+        
+    def close(self):
+        """
+        Saves anything this handler is responsible for, for when the program
+        exits
+        """
+        return None
\ No newline at end of file
@@ -0,0 +1,243 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from datetime import datetime
+from config import config
+from projects import ProjectManager
+from tasks import MAX_DEPTH, TaskManager
+from taskstore import TaskStore, columnar_store_available
+from benchmarks.synthetic import (DEFAULT_PARAMETERS, Parameters,
+                                  create_filehandlers, write_database)
+
+# The filters timed, by name
+FILTERS = {
+    'active': {},
+    'all': {'only_active': False},
+    'open': {'only_active': False, 'state': 'open'},
+    'priority': {'priority': 1},
+    'project': {'only_active': False, 'project': 'project0'},
+    'project_context': {'project': 'project1', 'context': 'context0'},
+    }
+
+
+def time_calls(function, repeat):
+    """
+    Calls function repeat times
+
+    Returns:
+        list: the number of seconds each call took
+    """
+    timings = []
+
+    for run in range(repeat):
+        start_time = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start_time)
+
+    return timings
+
+
+def summarise(timings, operations=1):
+    """
+    Summarises the timings of a benchmark, each of which covered a number of
+    operations
+    """
+    median = statistics.median(timings)
+
+    return {
+        'runs': len(timings),
+        'operations': operations,
+        'min': min(timings),
+        'median': median,
+        'mean': statistics.mean(timings),
+        'max': max(timings),
+        'median_per_operation': median / operations,
+        }
+
+
+def run_benchmarks(directory, tree_roots, repeat, adds, storage):
+    """
+    Times each benchmarked path against the synthetic database in directory
+
+    Args:
+        directory (str): where the database was written
+
+        tree_roots (list): the index of the root of each subtask tree
+
+        repeat (int): how many times to run each benchmark
+
+        adds (int): how many tasks to add in each run of the add_task
+                    benchmark
+
+        storage (str): 'pickle' or 'sqlite'
+
+    Returns:
+        dict: a summary of the timings of each benchmark, by name
+    """
+    results = {}
+
+    def record(name, function, operations=1):
+        results[name] = summarise(time_calls(function, repeat), operations)
+
+    task_filehandler, project_filehandler = create_filehandlers(directory,
+                                                                storage)
+
+    # Displays are timed in full, including formatting, but not shown
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        record('filehandler_load', task_filehandler.parse_file)
+        record('filehandler_load_lazily', task_filehandler.parse_file_lazily)
+
+        task_list = task_filehandler.parse_file()
+        record('filehandler_save',
+               lambda: task_filehandler.write_to_file(task_list))
+
+        record('task_manager_startup', lambda: TaskManager(task_filehandler))
+
+        task_manager = TaskManager(task_filehandler)
+        project_manager = ProjectManager(task_manager, project_filehandler)
+
+        if columnar_store_available():
+            task_store = TaskStore()
+            task_store.rebuild(task_manager.task_list)
+        else:
+            task_store = None
+
+        for name, criteria in FILTERS.items():
+            record('filter_' + name,
+                   lambda criteria=criteria: task_manager.filter(**criteria))
+
+            if task_store is not None:
+                record('columnar_filter_' + name,
+                       lambda criteria=criteria: task_store.filter(**criteria))
+
+        record('display_all_tasks', task_manager.display_all_tasks)
+        record('format_task_rows',
+               lambda: [task.attributes_as_list()
+                        for task in task_manager.task_list])
+
+        if tree_roots:
+            record('display_task_by_index_with_subtasks',
+                   lambda: task_manager.display_task_by_index(tree_roots[0]))
+
+        record('display_all_projects_with_tasks',
+               lambda: project_manager.display_all_projects(with_tasks=True))
+
+        # Last, as it adds to the task list the other benchmarks use
+        record('add_task',
+               lambda: [task_manager.add_task('benchmark task')
+                        for add in range(adds)],
+               operations=adds)
+
+    return results
+
+
+def compare(results, baseline):
+    """
+    Prints how the median of each benchmark compares with a previous run
+    """
+    print("{:<42} {:>12} {:>12} {:>8}".format(
+        'Benchmark', 'Baseline ms', 'Current ms', 'Ratio'))
+
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+
+        before = baseline[name]['median'] * 1000
+        after = result['median'] * 1000
+        print("{:<42} {:>12.3f} {:>12.3f} {:>8.2f}".format(
+            name, before, after, after / before if before else float('inf')))
+
+
+def main():
+    argument_parser = argparse.ArgumentParser(
+        prog='python -m benchmarks',
+        description="Times the task, project, filter and storage paths "
+                    "against a synthetic database")
+    argument_parser.add_argument('--tasks', type=int,
+                                 default=DEFAULT_PARAMETERS.tasks)
+    argument_parser.add_argument('--projects', type=int,
+                                 default=DEFAULT_PARAMETERS.projects)
+    argument_parser.add_argument('--contexts', type=int,
+                                 default=DEFAULT_PARAMETERS.contexts)
+    argument_parser.add_argument('--trees', type=int,
+                                 default=DEFAULT_PARAMETERS.trees,
+                                 help="the number of subtask trees")
+    argument_parser.add_argument('--depth', type=int,
+                                 default=DEFAULT_PARAMETERS.depth,
+                                 help="the levels of subtasks below the root "
+                                      "of each tree, at most {}".format(
+                                          MAX_DEPTH))
+    argument_parser.add_argument('--branching', type=int,
+                                 default=DEFAULT_PARAMETERS.branching,
+                                 help="the subtasks of each task in a tree")
+    argument_parser.add_argument('--blocked-fraction', type=float,
+                                 default=DEFAULT_PARAMETERS.blocked_fraction)
+    argument_parser.add_argument('--closed-fraction', type=float,
+                                 default=DEFAULT_PARAMETERS.closed_fraction)
+    argument_parser.add_argument('--project-fraction', type=float,
+                                 default=DEFAULT_PARAMETERS.project_fraction)
+    argument_parser.add_argument('--seed', type=int,
+                                 default=DEFAULT_PARAMETERS.seed)
+    argument_parser.add_argument('--repeat', type=int, default=5,
+                                 help="how many times to run each benchmark")
+    argument_parser.add_argument('--adds', type=int, default=100,
+                                 help="tasks added in each add_task run")
+    argument_parser.add_argument('--storage', choices=['pickle', 'sqlite'],
+                                 default=config.storage)
+    argument_parser.add_argument('--output', metavar='FILE',
+                                 help="write the results to FILE as JSON")
+    argument_parser.add_argument('--compare', metavar='FILE',
+                                 help="compare with the results in FILE")
+    arguments = argument_parser.parse_args()
+
+    if arguments.depth > MAX_DEPTH:
+        argument_parser.error("--depth can be at most {}".format(MAX_DEPTH))
+
+    parameters = Parameters(arguments.tasks, arguments.projects,
+                            arguments.contexts, arguments.trees,
+                            arguments.depth, arguments.branching,
+                            arguments.blocked_fraction,
+                            arguments.closed_fraction,
+                            arguments.project_fraction, arguments.seed)
+
+    with tempfile.TemporaryDirectory() as directory:
+        started = datetime.now().isoformat(timespec='seconds')
+        tree_roots = write_database(directory, parameters, arguments.storage)
+        results = run_benchmarks(directory, tree_roots, arguments.repeat,
+                                 arguments.adds, arguments.storage)
+
+    report = {
+        'started': started,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'settings': {
+            'storage': arguments.storage,
+            'journal': config.journal,
+            'lazy_load': config.lazy_load,
+            'pickle_protocol': config.pickle_protocol,
+            'compression': config.compression,
+            'numpy': columnar_store_available(),
+            },
+        'parameters': parameters._asdict(),
+        'results': results,
+        }
+
+    if arguments.output:
+        with open(arguments.output, 'w') as outfile:
+            json.dump(report, outfile, indent=4)
+
+    if arguments.compare:
+        with open(arguments.compare) as infile:
+            compare(results, json.load(infile)['results'])
+    else:
+        json.dump(report, sys.stdout, indent=4)
+        print()
+
+
+main()
@@ -0,0 +1,199 @@
+import os
+import random
+from collections import namedtuple
+from datetime import datetime, timedelta
+from config import config
+from filehandler import FileHandler
+from projects import Project
+from storage import PickleBackend, SQLiteBackend
+from tasks import MAX_DEPTH, Task
+
+# The shape of a synthetic database
+Parameters = namedtuple('Parameters', [
+    'tasks',
+    'projects',
+    'contexts',
+    'trees',
+    'depth',
+    'branching',
+    'blocked_fraction',
+    'closed_fraction',
+    'project_fraction',
+    'seed',
+    ])
+
+DEFAULT_PARAMETERS = Parameters(
+    10000, # tasks
+    50, # projects
+    10, # contexts, their use falls off as 1/rank
+    10, # trees, the number of subtask trees
+    6, # depth, the number of levels below the root of each tree
+    2, # branching, the number of subtasks of each task in a tree
+    0.1, # blocked_fraction
+    0.3, # closed_fraction
+    0.6, # project_fraction, the fraction of tasks in a project
+    0, # seed
+    )
+
+# How likely each priority is
+PRIORITY_WEIGHTS = {1: 10, 2: 20, 3: 50, 4: 20}
+
+WORDS = ('call', 'email', 'write', 'review', 'plan', 'fix', 'buy', 'book',
+         'report', 'budget', 'garden', 'car', 'meeting', 'invoice', 'draft',
+         'team', 'house', 'holiday', 'tax', 'website')
+
+
+def generate_tasks(parameters):
+    """
+    Generates synthetic tasks. The first tasks make up the subtask trees,
+    each a root with parameters.branching subtasks per task down to
+    parameters.depth levels, as far as the number of tasks allows.
+
+    Args:
+        parameters (Parameters): the shape of the data
+
+    Returns:
+        tuple: the list of tasks, and the index of the root of each tree
+    """
+    if parameters.depth > MAX_DEPTH:
+        raise ValueError("Subtask trees can't be deeper than {}".format(
+            MAX_DEPTH))
+
+    generator = random.Random(parameters.seed)
+    now = datetime.now()
+    project_names = project_descriptions(parameters.projects)
+    context_names = ['context{}'.format(rank)
+                     for rank in range(parameters.contexts)]
+    context_weights = [1 / (rank + 1) for rank in range(parameters.contexts)]
+    tasks = []
+
+    for index in range(parameters.tasks):
+        description = ' '.join(generator.choices(WORDS, k=4))
+        task = Task(description + ' ' + str(index),
+                    priority=generator.choices(
+                        list(PRIORITY_WEIGHTS),
+                        list(PRIORITY_WEIGHTS.values()))[0],
+                    created=now - timedelta(days=generator.randrange(365)))
+
+        if generator.random() < 0.3:
+            task.due = (now + timedelta(days=generator.randrange(90))
+                        ).strftime("%d %b %y")
+
+        if project_names and generator.random() < parameters.project_fraction:
+            task.projects = generator.choice(project_names)
+
+        if context_names:
+            task.contexts = generator.choices(context_names,
+                                              context_weights)[0]
+
+        if generator.random() < parameters.blocked_fraction:
+            task.blocked_until = 'waiting'
+
+        if generator.random() < parameters.closed_fraction:
+            task.state = 'closed'
+
+        tasks.append(task)
+
+    tree_roots = []
+    position = 0
+
+    for tree in range(parameters.trees):
+        if position >= len(tasks):
+            break
+
+        tree_roots.append(position)
+        level = [position]
+        position += 1
+
+        for depth in range(parameters.depth):
+            next_level = []
+
+            for parent in level:
+                for branch in range(parameters.branching):
+                    if position >= len(tasks):
+                        break
+
+                    # Trees are displayed below their roots, so every task in
+                    # them is kept open
+                    tasks[position].state = 'open'
+                    tasks[parent].subtasks = tasks[position].unique_id
+                    next_level.append(position)
+                    position += 1
+
+            level = next_level
+
+    return tasks, tree_roots
+
+
+def project_descriptions(count):
+    """
+    Returns the descriptions of count synthetic projects
+    """
+    return ['project{}'.format(number) for number in range(count)]
+
+
+def generate_projects(parameters):
+    """
+    Generates one synthetic project per name used by generate_tasks
+    """
+    return [Project(description)
+            for description in project_descriptions(parameters.projects)]
+
+
+def create_filehandlers(directory, storage=None):
+    """
+    Creates file handlers for a task file and a project file in directory,
+    using the storage and settings from the config unless told otherwise
+
+    Args:
+        directory (str): the directory to keep the files in
+
+        storage (str): 'pickle' or 'sqlite', defaults to config.storage
+
+    Returns:
+        tuple: the task file handler and the project file handler
+    """
+    if storage is None:
+        storage = config.storage
+
+    filehandlers = []
+
+    for table in ('tasks', 'projects'):
+        filename = os.path.join(directory, table + '.db')
+
+        if storage == 'sqlite':
+            backend = SQLiteBackend(os.path.join(directory, 'data.sqlite'),
+                                    table, protocol=config.pickle_protocol)
+        else:
+            backend = PickleBackend(filename, journal=config.journal,
+                                    table=table,
+                                    protocol=config.pickle_protocol,
+                                    compression=config.compression)
+
+        filehandlers.append(FileHandler(filename, table=table,
+                                        backend=backend))
+
+    return tuple(filehandlers)
+
+
+def write_database(directory, parameters, storage=None):
+    """
+    Generates a synthetic database and writes it to directory
+
+    Args:
+        directory (str): the directory to write the files to
+
+        parameters (Parameters): the shape of the data
+
+        storage (str): 'pickle' or 'sqlite', defaults to config.storage
+
+    Returns:
+        list: the index of the root of each subtask tree
+    """
+    tasks, tree_roots = generate_tasks(parameters)
+    task_filehandler, project_filehandler = create_filehandlers(directory,
+                                                                storage)
+    task_filehandler.write_to_file(tasks)
+    project_filehandler.write_to_file(generate_projects(parameters))
+
+    return tree_roots
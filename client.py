@@ -0,0 +1,54 @@
+import argparse
+import socket
+import sys
+from config import config
+from daemon import send_message, receive_message
+
+argument_parser = argparse.ArgumentParser(
+    description="Sends commands to a running command line tasks daemon")
+argument_parser.add_argument(
+    'command', nargs='*',
+    help="a single command to send from main mode, such as 'i a buy milk', "
+         "otherwise commands are read from a prompt")
+argument_parser.add_argument(
+    '--socket', default=config.socket_file,
+    help="the socket the daemon is listening on")
+arguments = argument_parser.parse_args()
+
+connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+try:
+    connection.connect(arguments.socket)
+except (ConnectionRefusedError, FileNotFoundError):
+    sys.exit("No daemon is listening on " + arguments.socket)
+
+if arguments.command:
+    send_message(connection, {'command': ' '.join(arguments.command)})
+    reply = receive_message(connection)
+
+    if reply is None:
+        sys.exit("The daemon closed the connection")
+
+    print(reply['output'], end='')
+    sys.exit()
+
+prompt = '>> '
+
+while True:
+    try:
+        command = input(prompt)
+    except EOFError:
+        break
+
+    send_message(connection, {'command': command})
+    reply = receive_message(connection)
+
+    if reply is None:
+        sys.exit("The daemon closed the connection")
+
+    print(reply['output'], end='')
+
+    if reply['ended']:
+        break
+
+    prompt = reply['prompt']
\ No newline at end of file
@@ -1,33 +1,65 @@
 import sys
+import threading
+import time
 import traceback
-from tasks import TaskCommandHandler
-from projects import ProjectCommandHandler
-from inbox import InboxCommandHandler
-from filter import FilterCommandHandler
+from config import config
+from base import CommandError, CommandLine
+from instrumentation import hooks
 
 class CommandParser():
     """
     Handles all the interactions with the command line and input from
     the user
 
+    Each mode's command handler, and the modules and data files behind it,
+    are only loaded the first time the mode is used, so that a quick command
+    in one mode doesn't pay for the others.
+
     Args:
-        task_list (list) the list of issues to be worked with
+        startup_profile (bool): whether to report how long it takes to build
+                                each command handler, defaults to False
     """
     
-    def __init__(self):
-        self.task_command_handler = TaskCommandHandler()
-        self.project_command_handler = ProjectCommandHandler()
-        self.inbox_command_handler = InboxCommandHandler(self)
-        self.filter_command_handler = FilterCommandHandler(
-            self.task_command_handler.get_task_manager(),
-            self.project_command_handler.get_project_manager()
-            )
+    def __init__(self, startup_profile=False):
+        self.startup_profile = startup_profile
+        
+        # The commands available in main mode, and how to build the handler
+        # for each of the other modes
+        self.switcher = {
+            'p': self.switch_to_project_mode,
+            'q': self.exit_program,
+            't': self.switch_to_task_mode,
+            'i': self.switch_to_inbox_mode,
+            'm': self.switch_to_main_mode,
+            'f': self.switch_to_filter_mode,
+            'migrate': self.migrate_to_sqlite,
+            'compact': self.compact_storage,
+            'stats': self.show_stats,
+            }
+        self.handler_builders = {
+            'task': self.build_task_command_handler,
+            'proj': self.build_project_command_handler,
+            'inbox': self.build_inbox_command_handler,
+            'filt': self.build_filter_command_handler,
+            }
         
-        # Sort out dependencies
-        self.project_command_handler.set_task_manager_on_project_manager(
-            self.task_command_handler.get_task_manager())
+        # The command handlers built so far, by mode
+        self.command_handlers = {}
                
         self.mode = 'main'
+        self.raise_errors = False
+        self.item_writes = True
+        
+        # Where commands come from in batch mode, None when prompting the user
+        self.command_source = None
+        
+        # Whether there is a user to prompt, which there isn't for a daemon
+        self.interactive = True
+        
+        # Held while running a command, so that nothing else touches the data
+        # until it's finished. Reentrant, as commands can run commands.
+        self.lock = threading.RLock()
+        self.autosave_worker = None
     
     def get_prompt(self):
         """
@@ -45,47 +77,112 @@ class CommandParser():
             }
             
         return (prompts[self.mode] + ' ')
+        
+    def read_command(self):
+        """
+        Returns the next command, prompting the user for it unless running a
+        batch of commands
+        
+        Args:
+            None.
+            
+        Returns:
+            str: the command
+        """
+        if self.command_source is None:
+            if not self.interactive:
+                raise EOFError("Commands can't prompt for input here")
+                
+            return input(self.get_prompt())
+            
+        try:
+            return next(self.command_source)
+        except StopIteration:
+            # Same as reaching the end of input at the prompt
+            raise EOFError("Ran out of commands")
+            
+    def can_read_commands(self):
+        """
+        Returns whether read_command has anywhere to read commands from
+        """
+        return self.interactive or self.command_source is not None
             
     def breakout(self, command):
         """
-        Find the appropriate function to handle this command
+        Runs a command line, along with any commands chained after it. The
+        line is split into words once, and chained commands are run in turn
+        rather than by recursing, so a chain can be any length.
         
         Args:
             command (str): the command being parsed
         """
-        try:
-            initial_command, arguments = command.split(maxsplit=1)
-        except ValueError:
-            # Happens when the command can't be split
-            initial_command = command
-            arguments = ''
+        command_line = CommandLine(command)
+        
+        with self.lock:
+            hooks.timed('line', self.mode, command_line.head(),
+                        self.run_command_line, command_line)
+                        
+    def run_command_line(self, command_line):
+        """
+        Runs each of the commands on a command line in turn
+        
+        Args:
+            command_line (CommandLine): the command line to run
             
-        SWITCHER = {
-            'p': self.switch_to_project_mode,
-            'q': self.exit_program,
-            't': self.switch_to_task_mode,
-            'i': self.switch_to_inbox_mode,
-            'm': self.switch_to_main_mode,
-            'f': self.switch_to_filter_mode,
-            }
+        Returns:
+            None.
+        """
+        while True:
+            arguments = command_line.remainder()
+            continued_command = self.dispatch(command_line.head(), arguments)
+            
+            if not continued_command:
+                return None
+                
+            if continued_command is arguments:
+                # The command didn't use its arguments, which start with the
+                # next command
+                command_line.advance()
+            elif not command_line.skip_to(continued_command):
+                # Only a command that returns something other than the rest
+                # of the line has what it returns split into words again
+                command_line = CommandLine(continued_command)
+                
+    def dispatch(self, initial_command, arguments):
+        """
+        Find the appropriate function to handle this command
         
-        continued_command = ""
+        Args:
+            initial_command (str): the name of the command
+            
+            arguments (str): the rest of the command line
+            
+        Returns:
+            str: any remaining command that was not consumed
+        """
         try:
             if self.mode == 'main' or initial_command == 'm':
-                handling_result = SWITCHER[initial_command]
-                continued_command = handling_result(arguments)
+                handling_result = self.switcher[initial_command]
+                return hooks.timed('command', self.mode, initial_command,
+                                   handling_result, arguments)
             else:
-                continued_command = self.dispatch_to_command_handler(command)
+                current_handler = self.get_command_handler(self.mode)
+                return current_handler.dispatch(initial_command, arguments)
         except KeyError:
+            if self.raise_errors:
+                raise CommandError("Command not found: " + initial_command)
+                
             print("Command not found") 
-        except StopIteration:
+        except (StopIteration, CommandError):
             raise
         except BaseException as err:
+            if self.raise_errors:
+                raise CommandError("That caused an exception: {}".format(err))
+                
             print("That caused an exception: {}".format(err))
             traceback.print_exc(file=sys.stdout)
-        
-        if continued_command:
-            self.breakout(continued_command)
+            
+        return None
                 
     def dispatch_to_command_handler(self, command):
         """
@@ -98,18 +195,112 @@ class CommandParser():
         Returns:
             str: any remaining command that was not consumed by the handler
         """
-        handler_dict = {
-            'task': self.task_command_handler,
-            'proj': self.project_command_handler,
-            'inbox': self.inbox_command_handler,
-            'filt': self.filter_command_handler,
-            }
-        
-        current_handler = handler_dict[self.mode]
+        current_handler = self.get_command_handler(self.mode)
         remaining_command = current_handler.handle_command(command)
         
         return remaining_command
     
+    def run_batch(self, commands, stop_on_error=False):
+        """
+        Runs a batch of commands without prompting, then saves everything
+        once at the end. Changes aren't saved item by item along the way, as
+        the final save writes them all.
+        
+        Args:
+            commands (iterable): the commands, one per line. Blank lines and
+                                 lines starting with '#' are skipped.
+                                 
+            stop_on_error (bool): whether to stop at the first command that
+                                  fails, defaults to False
+                                  
+        Returns:
+            bool: False if the batch was stopped by a failed command
+        """
+        self.set_raise_errors(stop_on_error)
+        self.command_source = (line.strip() for line in commands
+                               if line.strip()
+                               and not line.lstrip().startswith('#'))
+        
+        self.set_item_writes(False)
+        
+        succeeded = True
+        
+        try:
+            for command in self.command_source:
+                self.breakout(command)
+                
+        except StopIteration:
+            # The batch quit, which has already saved everything
+            return succeeded
+            
+        except CommandError as err:
+            print(err, file=sys.stderr)
+            succeeded = False
+            
+        try:
+            self.exit_program()
+        except StopIteration:
+            pass
+            
+        return succeeded
+    
+    def set_raise_errors(self, raise_errors):
+        """
+        Sets whether a failed command raises a CommandError, here and in each
+        command handler, rather than printing the error and carrying on
+        """
+        self.raise_errors = raise_errors
+        
+        for handler in self.command_handlers.values():
+            handler.raise_errors = raise_errors
+            
+    def set_item_writes(self, item_writes):
+        """
+        Sets whether each manager's changes are saved item by item as they
+        happen, or only by the full save on exit
+        """
+        self.item_writes = item_writes
+        
+        for handler in self.command_handlers.values():
+            for manager in handler.get_managers():
+                manager.filehandler.item_writes = item_writes
+    
+    def start_autosave(self):
+        """
+        Starts saving changes in the background, every
+        config.autosave_interval seconds, unless that's None
+        """
+        if not config.autosave_interval:
+            return None
+            
+        from autosave import AutosaveWorker
+        
+        self.autosave_worker = AutosaveWorker(self, config.autosave_interval)
+        self.autosave_worker.start()
+        
+    def stop_autosave(self):
+        """
+        Stops saving changes in the background, once the final save has been
+        made by exit_program
+        """
+        if self.autosave_worker is not None:
+            self.autosave_worker.stop()
+            self.autosave_worker = None
+        
+    def autosave(self):
+        """
+        Saves each manager that has changed since it was last saved,
+        leaving the rest alone
+        
+        Returns:
+            list: the managers that were saved
+        """
+        with self.lock:
+            return [manager
+                    for handler in list(self.command_handlers.values())
+                    for manager in handler.get_managers()
+                    if manager.autosave()]
+    
     def get_current_mode(self):
         """
         Returns the current mode of this command handler
@@ -121,6 +312,87 @@ class CommandParser():
         Sets the current mode of this command handler
         """
         self.mode = new_mode
+        
+    ############################################################################
+    # Command handlers
+    ############################################################################
+    def get_command_handler(self, mode):
+        """
+        Returns the command handler for a mode, building it the first time
+        it's needed
+        
+        Args:
+            mode (str): the mode to get the handler for
+            
+        Returns:
+            BaseCommandHandler: the handler for the mode
+        """
+        handler = self.command_handlers.get(mode)
+        
+        if handler is None:
+            start_time = time.perf_counter()
+            
+            handler = self.handler_builders[mode]()
+            handler.raise_errors = self.raise_errors
+            handler.mode = mode
+            
+            for manager in handler.get_managers():
+                manager.filehandler.item_writes = self.item_writes
+                
+            self.command_handlers[mode] = handler
+            
+            if self.startup_profile:
+                print("Built the {} command handler in {:.1f} ms".format(
+                    mode, 1000 * (time.perf_counter() - start_time)),
+                    file=sys.stderr)
+            
+        return handler
+        
+    @property
+    def task_command_handler(self):
+        return self.get_command_handler('task')
+        
+    @property
+    def project_command_handler(self):
+        return self.get_command_handler('proj')
+        
+    @property
+    def inbox_command_handler(self):
+        return self.get_command_handler('inbox')
+        
+    @property
+    def filter_command_handler(self):
+        return self.get_command_handler('filt')
+        
+    def build_task_command_handler(self):
+        from tasks import TaskCommandHandler
+        
+        return TaskCommandHandler()
+        
+    def build_project_command_handler(self):
+        from projects import ProjectCommandHandler
+        
+        project_command_handler = ProjectCommandHandler()
+        
+        # Only some project commands need the task manager, so it isn't
+        # built until one of them does
+        project_command_handler.set_task_manager_source_on_project_manager(
+            lambda: self.task_command_handler.get_task_manager())
+            
+        return project_command_handler
+        
+    def build_inbox_command_handler(self):
+        from inbox import InboxCommandHandler
+        
+        return InboxCommandHandler(self)
+        
+    def build_filter_command_handler(self):
+        from filter import FilterCommandHandler
+        
+        return FilterCommandHandler(
+            self.task_command_handler.get_task_manager(),
+            self.project_command_handler.get_project_manager()
+            )
 
 
     ############################################################################
@@ -161,11 +433,90 @@ class CommandParser():
         self.mode = 'main'
         return remaining_command
                
+    def migrate_to_sqlite(self, remaining_command=''):
+        """
+        Saves everything, then imports the task and project pickle files into
+        the SQLite database
+        """
+        if config.storage == 'sqlite':
+            print("Already using SQLite storage")
+            return remaining_command
+            
+        from storage import migrate_pickles_to_sqlite
+        
+        for handler in self.command_handlers.values():
+            handler.close()
+        
+        imported = migrate_pickles_to_sqlite()
+        print("Imported {} tasks and {} projects into {}".format(
+            imported['tasks'], imported['projects'], config.database_file))
+        print("Set storage to 'sqlite' in config.py to start using it")
+        
+        return remaining_command
+
+    def compact_storage(self, remaining_command=''):
+        """
+        Rewrites the task and project files in full and reports on each
+        """
+        for manager in [self.task_command_handler.get_task_manager(),
+                        self.project_command_handler.get_project_manager()]:
+            report = manager.compact()
+            print("Wrote {} bytes to {} in {:.3f}s".format(
+                report.size, report.filename, report.seconds))
+            
+        return remaining_command
+
+    def show_stats(self, remaining_command=''):
+        """
+        Shows the latency of each command and storage operation timed so
+        far. Followed by 'on' or 'off' turns timing on or off, by 'reset'
+        discards what has been timed, and by 'dump' and a filename writes it
+        all to that file as JSON.
+        """
+        try:
+            action, filename = remaining_command.split(maxsplit=1)
+        except ValueError:
+            action = remaining_command.strip()
+            filename = None
+            
+        if action in ('on', 'off'):
+            hooks.enabled = (action == 'on')
+            print("Timing is " + action)
+        elif action == 'reset':
+            hooks.reset()
+        elif action == 'dump' and filename:
+            hooks.dump(filename)
+            print("Wrote timings to " + filename)
+        elif action:
+            print("Use stats, stats on, stats off, stats reset or "
+                  "stats dump <file>")
+        elif not hooks.histograms:
+            print("Nothing has been timed, use 'stats on' to start timing")
+        else:
+            from prettytable import PrettyTable
+            
+            table = PrettyTable(['Kind', 'Mode', 'Name', 'Calls', 'Mean ms',
+                                 'p50 ms', 'p95 ms', 'p99 ms', 'Max ms'])
+            
+            for (kind, mode, name), histogram in hooks.sorted_histograms():
+                table.add_row([kind, mode, name, histogram.count]
+                              + ['{:.3f}'.format(1000 * seconds)
+                                 for seconds in [
+                                     histogram.total / histogram.count,
+                                     histogram.percentile(50),
+                                     histogram.percentile(95),
+                                     histogram.percentile(99),
+                                     histogram.maximum]])
+                                     
+            print(table)
+            
+        return None
+
     def exit_program(self, remaining_command=''):
         """
-        Shuts down the program
+        Shuts down the program, saving whatever was loaded
         """
-        self.task_command_handler.close()
-        self.project_command_handler.close()
-        self.inbox_command_handler.close()
+        for handler in self.command_handlers.values():
+            handler.close()
+            
         raise StopIteration
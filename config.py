@@ -7,10 +7,38 @@ ConfigTuple = namedtuple('Config', [
     'task_file',
     'project_file',
     'inbox_file',
+    'filter_file',
+    'search_file',
+    'journal',
+    'storage',
+    'database_file',
+    'lazy_load',
+    'pickle_protocol',
+    'compression',
+    'socket_file',
+    'autosave_interval',
+    'instrumentation',
+    'streaming_listings',
+    'page_size',
+    'search_trigrams',
     ])
 
 config = ConfigTuple(
     BASE_PATH + 'tasks.db', # task_file
     BASE_PATH + 'projects.db', # project_file
     BASE_PATH + 'inbox.txt', # inbox file
+    BASE_PATH + 'filters.db', # filter_file, the saved filters
+    BASE_PATH + 'search.idx', # search_file, the saved search index
+    True, # journal, append each change to a journal next to the data file
+    'pickle', # storage, either 'pickle' or 'sqlite'
+    BASE_PATH + 'tasks.sqlite', # database_file, used by sqlite storage
+    True, # lazy_load, only load each task when a command first uses it
+    5, # pickle_protocol
+    None, # compression, None, 'zlib' or 'lzma'
+    BASE_PATH + 'tasks.sock', # socket_file, where the daemon listens
+    60, # autosave_interval, seconds between saves of changes, None for never
+    False, # instrumentation, time every command from startup, see 'stats'
+    False, # streaming_listings, always list in pages, not single tables
+    50, # page_size, rows between repeated headings in a streamed listing
+    True, # search_trigrams, let searches match parts of words
     )
\ No newline at end of file
@@ -0,0 +1,221 @@
+import json
+import os
+import signal
+import socket
+import socketserver
+import struct
+from contextlib import redirect_stdout
+from io import StringIO
+from config import config
+
+# Each message is this header, holding the length of the message body, then
+# the body itself as UTF-8 encoded JSON
+MESSAGE_HEADER = struct.Struct('>I')
+
+
+def send_message(connection, message):
+    """
+    Sends a message over a socket
+
+    Args:
+        connection (socket): the socket to send on
+
+        message (dict): the message, which must be serialisable as JSON
+
+    Returns:
+        None.
+    """
+    body = json.dumps(message).encode('utf-8')
+    connection.sendall(MESSAGE_HEADER.pack(len(body)) + body)
+
+
+def receive_message(connection):
+    """
+    Receives a message sent by send_message
+
+    Args:
+        connection (socket): the socket to receive on
+
+    Returns:
+        dict: the message, or None if the other end closed the connection
+    """
+    header = receive_exactly(connection, MESSAGE_HEADER.size)
+
+    if header is None:
+        return None
+
+    body = receive_exactly(connection, MESSAGE_HEADER.unpack(header)[0])
+
+    if body is None:
+        return None
+
+    return json.loads(body.decode('utf-8'))
+
+
+def receive_exactly(connection, size):
+    """
+    Receives exactly size bytes from a socket, or returns None if it closes
+    first
+    """
+    chunks = []
+
+    while size:
+        chunk = connection.recv(size)
+
+        if not chunk:
+            return None
+
+        chunks.append(chunk)
+        size -= len(chunk)
+
+    return b''.join(chunks)
+
+
+class CommandRequestHandler(socketserver.BaseRequestHandler):
+    """
+    Serves a single client, running each command line it sends and replying
+    with the output. Each client has its own mode, starting in main mode.
+    """
+
+    def handle(self):
+        mode = 'main'
+
+        while True:
+            request = receive_message(self.request)
+
+            if request is None:
+                return None
+
+            reply = self.server.run_command(request['command'], mode)
+            send_message(self.request, reply)
+
+            if reply['ended']:
+                return None
+
+            mode = reply['mode']
+
+
+class CommandServer(socketserver.ThreadingUnixStreamServer):
+    """
+    Keeps the task, project and inbox data in memory and runs command lines
+    sent by clients over a Unix domain socket. Clients are served
+    concurrently, but commands run one at a time under the command parser's
+    lock, so changes are never made by two clients at once.
+
+    Args:
+        socket_file (str): the path of the socket to listen on
+
+        command_parser (CommandParser): runs the commands, and holds all the
+                                        data they work on
+    """
+    daemon_threads = True
+
+    def __init__(self, socket_file, command_parser):
+        self.command_parser = command_parser
+        self.command_parser.interactive = False
+        super().__init__(socket_file, CommandRequestHandler)
+
+    def run_command(self, command, mode):
+        """
+        Runs a command line in the given mode, capturing what it prints
+
+        Args:
+            command (str): the command line
+
+            mode (str): the mode of the client that sent it
+
+        Returns:
+            dict: the output, the client's mode and prompt after the command,
+                  and whether the command ended the client's session
+        """
+        output = StringIO()
+        ended = False
+
+        with self.command_parser.lock:
+            self.command_parser.set_mode(mode)
+
+            try:
+                with redirect_stdout(output):
+                    self.command_parser.breakout(command)
+            except StopIteration:
+                # Quitting saves everything, and ends this client's session
+                # without stopping the daemon
+                ended = True
+
+            return {
+                'output': output.getvalue(),
+                'mode': self.command_parser.get_current_mode(),
+                'prompt': self.command_parser.get_prompt(),
+                'ended': ended,
+                }
+
+    def save(self):
+        """
+        Saves all the data, waiting for any running command to finish first
+        """
+        with self.command_parser.lock:
+            try:
+                self.command_parser.exit_program()
+            except StopIteration:
+                pass
+
+
+def remove_stale_socket(socket_file):
+    """
+    Removes a socket file left behind by a daemon that didn't shut down
+    cleanly, refusing to start if another daemon is still listening on it
+    """
+    if not os.path.exists(socket_file):
+        return None
+
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+    try:
+        probe.connect(socket_file)
+    except (ConnectionRefusedError, FileNotFoundError):
+        os.remove(socket_file)
+    else:
+        raise SystemExit("A daemon is already listening on " + socket_file)
+    finally:
+        probe.close()
+
+
+def serve(command_parser, socket_file=None):
+    """
+    Runs the daemon until it's interrupted or terminated, then saves
+    everything and removes the socket
+
+    Args:
+        command_parser (CommandParser): runs the commands
+
+        socket_file (str): the socket to listen on, defaults to the one in
+                           the config
+
+    Returns:
+        None.
+    """
+    if socket_file is None:
+        socket_file = config.socket_file
+
+    # Load everything now, so that no client waits for it
+    for mode in command_parser.handler_builders:
+        command_parser.get_command_handler(mode)
+
+    remove_stale_socket(socket_file)
+    server = CommandServer(socket_file, command_parser)
+    command_parser.start_autosave()
+
+    def stop(signal_number, frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, stop)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.remove(socket_file)
+        server.save()
+        command_parser.stop_autosave()
\ No newline at end of file
@@ -1,41 +1,75 @@
-import pickle
-from logging import FileHandler
+import os
+from instrumentation import hooks
+from storage import create_backend, file_signature
 
 class FileHandler():
     """
-    Responsible for reading and writing to a pickle file
+    Responsible for reading and writing a list of items through a storage
+    backend, and for reading and writing plain text files
     
     Args:
         filename (str): the file for this filehandler to use
+        
+        table (str): the table to use when the config selects a database
+                     backend, defaults to None
+                     
+        backend (StorageBackend): the backend to use, defaults to the one
+                                  chosen in the config
     """
     
-    def __init__(self, filename):
+    def __init__(self, filename, table=None, backend=None):
         self.filename = filename
+        
+        if backend is None:
+            backend = create_backend(filename, table)
+            
+        self.backend = backend
+        
+        # What storage operations on this file are timed under
+        self.name = table or os.path.basename(filename)
+        
+        # Whether write_item saves each item as it changes, turned off when
+        # everything is about to be written in full anyway
+        self.item_writes = True
 
     def parse_file(self):
         """
-        Parses the contents of the associated file and returns it.
+        Parses the contents of the associated storage and returns it.
         
         Args:
             None.
             
         Returns:
-            list: everything under the 'data' key in the file, assumed
-                  to be a list
+            list: all of the stored items
         """
-        try:
-            with open(self.filename, 'rb') as infile:
-                file_contents = pickle.load(infile)
-                return file_contents['data']
+        return hooks.timed('storage', self.name, 'load', self.backend.load)
+        
+    def parse_file_lazily(self):
+        """
+        Parses just enough of the associated storage to know what it holds,
+        leaving each item to be loaded the first time it is accessed.
+        
+        Args:
+            None.
             
-        except FileNotFoundError:
-            # File doesn't exist, start from scratch
-            return []
+        Returns:
+            LazyItemList: all of the stored items, loaded on demand
+        """
+        return hooks.timed('storage', self.name, 'load_lazy',
+                           self.backend.load_lazy)
+        
+    def parse_item(self, position):
+        """
+        Returns the single stored item at position
+        
+        Args:
+            position (int): the index of the item in the data list
+            
+        Returns:
+            The stored item.
+        """
+        return self.backend.load_item(position)
         
-        except EOFError:
-            # File doesn't contain what we're looking for, start from scratch
-            return []
-
     def parse_text_file(self):
         """
         Parses the contents of a plaintext files associated with this
@@ -59,19 +93,77 @@ class FileHandler():
     
     def write_to_file(self, data):
         """
-        Writes data to the filename associated with this FileHandler
+        Writes data to the storage associated with this FileHandler
         
         Args:
             data (list): all the data to write to file
             
         Returns:
-            None.
+            SnapshotReport: what was written and how long it took
         """      
-        with open(self.filename, 'wb') as outfile:
-            file_contents = {}
-            file_contents['data'] = data
-            pickle.dump(file_contents, outfile)
+        return hooks.timed('storage', self.name, 'save', self.backend.save,
+                           data)
+        
+    def compact(self, data):
+        """
+        Rewrites data to the associated storage as compactly as possible,
+        folding in anything written item by item since the last full write
+        
+        Args:
+            data (list): all the data to write to file
+            
+        Returns:
+            SnapshotReport: what was written and how long it took
+        """
+        return hooks.timed('storage', self.name, 'compact',
+                           self.backend.compact, data)
+            
+    def write_item(self, position, item):
+        """
+        Saves a single new or changed item, at whatever cost the backend
+        allows short of rewriting everything
+        
+        Args:
+            position (int): the index of the item in the data list
+            
+            item: the new or changed item
+            
+        Returns:
+            None.
+        """
+        if self.item_writes:
+            hooks.timed('storage', self.name, 'save_item',
+                        self.backend.save_item, position, item)
+            
+    def write_items(self, items):
+        """
+        Saves several new or changed items together, as a single write where
+        the backend allows
+        
+        Args:
+            items (list): (position, item) pairs, each new or changed item
+                          and its index in the data list
+                          
+        Returns:
+            None.
+        """
+        if self.item_writes and items:
+            hooks.timed('storage', self.name, 'save_items',
+                        self.backend.save_items, items)
+            
+    def signature(self):
+        """
+        Returns a summary of the files behind this FileHandler that changes
+        whenever the data stored in them does
+        
+        Args:
+            None.
             
+        Returns:
+            tuple: as returned by storage.file_signature
+        """
+        return file_signature(self.backend.files())
+        
     def write_to_text_file(self, data):
         """
         Writes a list to the filename associated with this FileHandler
@@ -1,4 +1,8 @@
-from base import BaseCommandHandler
+from config import config
+from filehandler import FileHandler
+from base import BaseCommandHandler, CommandError
+from listing import parse_page
+from query import QueryError, compile_query, start_of_today
 
 class FilterCommandHandler(BaseCommandHandler):
     """
@@ -15,28 +19,414 @@ class FilterCommandHandler(BaseCommandHandler):
         self.filter_manager = FilterManager(task_manager, project_manager)
         self.switcher = {
             'act': self.display_all_active_tasks,
+            'q': self.display_query_results,
+            'sf': self.save_filter,
+            'rf': self.run_saved_filter,
+            'lf': self.list_saved_filters,
+            'df': self.delete_saved_filter,
+            's': self.search,
             }
+            
+        # Only built the first time there's a search, as it may have to
+        # index every task
+        self.search_manager = None
+            
+    def get_managers(self):
+        if self.search_manager is None:
+            return [self.filter_manager]
+            
+        # The search index is saved last, once the task and project files
+        # it's checked against have been
+        return [self.filter_manager, self.search_manager]
+        
+    def close(self):
+        """
+        Close the filter manager, and the search index if it was used, for
+        when the program exits
+        """
+        for manager in self.get_managers():
+            manager.close()
         
     def display_all_active_tasks(self, remaining_command):
         """
-        Displays all active tasks from the task manager
+        Displays all active tasks from the task manager, or a page of them
+        when followed by --limit or --offset and a number of tasks
+        """
+        page, remaining_command = parse_page(remaining_command)
+        self.filter_manager.all_active_tasks(page)
+        return remaining_command
+        
+    def display_query_results(self, query):
+        """
+        Displays the tasks matching a query, such as 'priority<=2 and
+        context:office and not blocked', which takes up the rest of the
+        line. A page of them is shown when the query is preceded by --limit
+        or --offset and a number of tasks.
+        """
+        page, query = parse_page(query)
+        
+        try:
+            self.filter_manager.query(query, page)
+        except QueryError as err:
+            self.report_error(err)
+            
+    def save_filter(self, details):
+        """
+        Saves a query under a name, such as 'sf urgent priority=1 and
+        active', replacing any saved filter with the same name
+        """
+        try:
+            name, query = details.split(maxsplit=1)
+        except ValueError:
+            print("Give a name and then a query")
+            return None
+            
+        try:
+            self.filter_manager.save_filter(name, query)
+        except QueryError as err:
+            self.report_error(err)
+            
+    def run_saved_filter(self, remaining_command):
+        """
+        Displays the tasks matching the saved filter named next, or a page
+        of them when the name is preceded by --limit or --offset and a
+        number of tasks
+        """
+        page, remaining_command = parse_page(remaining_command)
+        name, remaining_command = self.split_name(remaining_command)
+        
+        if name is not None:
+            self.filter_manager.run_saved_filter(name, page)
+            
+        return remaining_command
+        
+    def list_saved_filters(self, remaining_command):
+        """
+        Displays each saved filter, with how many tasks it matches
         """
-        self.filter_manager.all_active_tasks()
+        self.filter_manager.display_saved_filters()
         return remaining_command
         
+    def delete_saved_filter(self, remaining_command):
+        """
+        Deletes the saved filter named next
+        """
+        name, remaining_command = self.split_name(remaining_command)
+        
+        if name is not None:
+            self.filter_manager.delete_saved_filter(name)
+            
+        return remaining_command
+        
+    def search(self, text):
+        """
+        Displays the tasks and projects matching every word that follows,
+        best match first. A page of the tasks is shown when the words are
+        preceded by --limit or --offset and a number of tasks.
+        """
+        page, text = parse_page(text)
+        
+        if self.search_manager is None:
+            from search import SearchManager
+            
+            self.search_manager = SearchManager(
+                self.filter_manager.task_manager,
+                self.filter_manager.project_manager)
+                
+        self.filter_manager.display_search_results(
+            self.search_manager.search(text), page)
+            
+    def split_name(self, remaining_command):
+        """
+        Splits the name of a saved filter from the start of a command's
+        arguments, reporting an unknown name
+        
+        Returns:
+            tuple: the name, or None if there isn't a saved filter with that
+                   name, and the arguments left after it
+        """
+        words = remaining_command.split(maxsplit=1)
+        
+        if not words:
+            print("Give the name of a saved filter")
+            return None, None
+            
+        if words[0] not in self.filter_manager.views:
+            self.report_error("There's no saved filter named " + words[0])
+            return None, None
+            
+        return words[0], words[1] if len(words) > 1 else ''
+        
+    def report_error(self, err):
+        """
+        Reports a command that failed, raising a CommandError instead when
+        asked to
+        """
+        if self.raise_errors:
+            raise CommandError(str(err))
+            
+        print(err)
+        
 class FilterManager():
     """
     Handles requests for filters by printing relevant output to the screen.
     
-    The filter manager is stateless.
+    Saved filters are named queries, stored in the filter file. Each has a
+    materialised view holding the tasks it matches, which is kept up to date
+    as tasks change so that running it doesn't search the task list.
+    
+    Args:
+        task_manager (TaskManager): the tasks to filter
+        
+        project_manager (ProjectManager): the projects
+        
+        filehandler (FileHandler): where the saved filters are stored,
+                                   defaults to the filter file in the config
     """
-    def __init__(self, task_manager, project_manager):
+    def __init__(self, task_manager, project_manager, filehandler=None):
+        if filehandler is None:
+            filehandler = FileHandler(config.filter_file, table='filters')
+            
         self.task_manager = task_manager
         self.project_manager = project_manager
+        self.filehandler = filehandler
+        self.saved_filters = self.filehandler.parse_file()
+        
+        # The view of each saved filter, by name
+        self.views = {}
+        
+        # Whether anything has changed since the saved filters were last
+        # written
+        self.dirty = False
+        
+        for saved_filter in self.saved_filters:
+            try:
+                self.__add_view(saved_filter)
+            except QueryError as err:
+                print("The saved filter {} can't be run: {}".format(
+                    saved_filter.name, err))
+                    
+    def all_active_tasks(self, page=None):
+        """
+        Displays all tasks that can current be acted on, in index order, as
+        a single table or the given Page of them
+        """
+        self.task_manager.display_list_of_tasks_by_index(
+            self.task_manager.filter(only_active=True), page)
+            
+    def query(self, text, page=None):
+        """
+        Displays the tasks matching a query, in index order, as a single
+        table or the given Page of them
+        """
+        self.task_manager.display_list_of_tasks_by_index(
+            compile_query(text).run(self.task_manager), page)
+            
+    def display_search_results(self, results, page=None):
+        """
+        Displays the tasks and then the projects found by a search, in the
+        order given
+        
+        Args:
+            results (tuple): the indices of the tasks and of the projects
+                             found, as returned by SearchManager.search
+                             
+            page (Page): which rows of tasks to stream, defaults to None for
+                         a single table of them all
+                         
+        Returns:
+            None.
+        """
+        task_indices, project_indices = results
+        
+        if not task_indices and not project_indices:
+            print("Nothing matches")
+            return None
+            
+        if task_indices:
+            self.task_manager.display_list_of_tasks_by_index(
+                task_indices, page, in_order=True)
+                
+        if project_indices:
+            self.project_manager.display_projects_by_index(project_indices)
+            
+    def save_filter(self, name, query):
+        """
+        Saves a query under a name, replacing any saved filter with the same
+        name, and shows the tasks it matches
         
-    def all_active_tasks(self):
+        Args:
+            name (str): the name to save the query under
+            
+            query (str): the query
+            
+        Returns:
+            None.
         """
-        Returns all tasks that can current be acted on, in index order
+        saved_filter = SavedFilter(name, query)
+        
+        # Compiled first, so that a query that can't be parsed isn't saved
+        self.__add_view(saved_filter)
+        
+        positions = [position for position, existing
+                     in enumerate(self.saved_filters) if existing.name == name]
+                     
+        if positions:
+            self.saved_filters[positions[0]] = saved_filter
+        else:
+            self.saved_filters.append(saved_filter)
+            positions = [len(self.saved_filters) - 1]
+            
+        self.filehandler.write_item(positions[0], saved_filter)
+        self.dirty = True
+        self.run_saved_filter(name)
+        
+    def run_saved_filter(self, name, page=None):
+        """
+        Displays the tasks matching a saved filter, in index order, as a
+        single table or the given Page of them
         """
         self.task_manager.display_list_of_tasks_by_index(
-            self.task_manager.filter(only_active=True))
\ No newline at end of file
+            self.views[name].indices(), page)
+            
+    def delete_saved_filter(self, name):
+        """
+        Deletes a saved filter
+        """
+        self.task_manager.remove_listener(self.views.pop(name))
+        self.saved_filters = [saved_filter for saved_filter
+                              in self.saved_filters if saved_filter.name != name]
+                              
+        # Removing an item moves the rest, so everything is written again
+        self.close()
+        
+    def display_saved_filters(self):
+        """
+        Outputs a table showing each saved filter and how many tasks it
+        matches
+        """
+        from prettytable import PrettyTable
+        
+        table = PrettyTable(['Name', 'Query', 'Tasks'])
+        table.align['Query'] = "l"
+        
+        for saved_filter in self.saved_filters:
+            view = self.views.get(saved_filter.name)
+            table.add_row([saved_filter.name, saved_filter.query,
+                           'None' if view is None else len(view)])
+                           
+        print(table)
+        
+    def __add_view(self, saved_filter):
+        """
+        Builds the view of a saved filter, replacing any view with the same
+        name, and keeps it up to date from then on
+        """
+        view = MaterialisedView(compile_query(saved_filter.query),
+                                self.task_manager)
+        previous_view = self.views.get(saved_filter.name)
+        
+        if previous_view is not None:
+            self.task_manager.remove_listener(previous_view)
+            
+        self.views[saved_filter.name] = view
+        self.task_manager.add_listener(view)
+        
+        
+    def autosave(self):
+        """
+        Writes the saved filters to file if anything has changed since they
+        were last written
+        
+        Returns:
+            bool: whether anything was written
+        """
+        if not self.dirty:
+            return False
+            
+        self.close()
+        return True
+        
+    def close(self):
+        """
+        Closes the filter manager by writing the saved filters to file
+        """
+        self.filehandler.write_to_file(self.saved_filters)
+        self.dirty = False
+        
+
+class MaterialisedView():
+    """
+    The unique IDs of the tasks matching a query, worked out once and then
+    kept up to date as a task manager's listener. Only a change to one of
+    the attributes the query reads causes the changed task to be checked
+    again, so keeping the view costs a predicate call per relevant change
+    and reading it costs time in proportion to the number of matches. A
+    view of a query relative to the day, such as 'due<today', is worked out
+    again the first time it's read on a new day.
+
+    Args:
+        query (Query): the compiled query
+
+        task_manager (TaskManager): the tasks the query is run against
+    """
+    def __init__(self, query, task_manager):
+        self.query = query
+        self.task_manager = task_manager
+        self.tasks_reindexed()
+
+    def __len__(self):
+        self.__refresh_if_stale()
+        return len(self.unique_ids)
+
+    def indices(self):
+        """
+        Returns the indices of the matching tasks, in index order
+        """
+        self.__refresh_if_stale()
+        return sorted(self.task_manager.unique_id_index[unique_id]
+                      for unique_id in self.unique_ids)
+
+    def task_added(self, task):
+        self.__check_task(task)
+
+    def task_changed(self, task, attribute):
+        if attribute in self.query.attributes:
+            self.__check_task(task)
+
+    def tasks_reindexed(self):
+        self.unique_ids = self.query.find_unique_ids(self.task_manager)
+
+        # The day the tasks were found on, when that affects which match
+        self.found_on = start_of_today() if self.query.relative else None
+
+    def __refresh_if_stale(self):
+        """
+        Finds the matching tasks again if the query is relative to the day
+        and the day has changed since they were found
+        """
+        if self.query.relative and start_of_today() != self.found_on:
+            self.tasks_reindexed()
+
+    def __check_task(self, task):
+        """
+        Adds the task to the view if it matches, or removes it if it doesn't
+        """
+        if self.query.predicate(task):
+            self.unique_ids.add(task.unique_id)
+        else:
+            self.unique_ids.discard(task.unique_id)
+
+
+class SavedFilter():
+    """
+    A query saved under a name
+
+    Args:
+        name (str): the name to run the query by
+
+        query (str): the query
+    """
+    def __init__(self, name, query):
+        self.name = name
+        self.query = query
\ No newline at end of file
@@ -28,6 +28,9 @@ class InboxCommandHandler(BaseCommandHandler):
         Close the inbox, for when the program exits
         """
         self.inbox.close()
+        
+    def get_managers(self):
+        return [self.inbox]
 
 class Inbox():
     """
@@ -37,6 +40,9 @@ class Inbox():
         self.filehandler = FileHandler(config.inbox_file)
         self.inbox_contents = self.filehandler.parse_text_file()
         self.command_parser = None
+        
+        # Whether anything has changed since the inbox was last written
+        self.dirty = False
 
     ############################################################################
     # Inbox commands
@@ -45,7 +51,9 @@ class Inbox():
         """
         Add something to the inbox
         """
-        self.inbox_contents.append(description)
+        # Each item is a line of the inbox file
+        self.inbox_contents.append(description + '\n')
+        self.dirty = True
         
     def display(self, remaining_command):
         """
@@ -60,12 +68,16 @@ class Inbox():
         """
         Process a single inbox item
         """
+        if not self.command_parser.can_read_commands():
+            print("The inbox can only be processed interactively")
+            return None
+            
         previous_mode = self.command_parser.get_current_mode()
         self.command_parser.switch_to_main_mode()
 
         while True:
             try:
-                command = input(self.command_parser.get_prompt())   
+                command = self.command_parser.read_command()
                 self.command_parser.breakout(command)
             except StopIteration:
                 # Item processed
@@ -77,18 +89,38 @@ class Inbox():
         """
         Process the inbox, from top (oldest) to bottom (newest)
         """
+        if not self.command_parser.can_read_commands():
+            print("The inbox can only be processed interactively")
+            return remaining_command
+            
         for line_number, line in enumerate(self.inbox_contents):
             print("Item to process: " + line.rstrip())
             self.process_item(line_number)
             
         self.inbox_contents = []    
+        self.dirty = True
             
         return remaining_command
     
     ############################################################################
     
+    def autosave(self):
+        """
+        Writes the current state to file if anything has changed since it
+        was last written
+        
+        Returns:
+            bool: whether anything was written
+        """
+        if not self.dirty:
+            return False
+            
+        self.close()
+        return True
+    
     def close(self):    
         """
         Closes the inbox by writing current state to file
         """
-        self.filehandler.write_to_text_file(self.inbox_contents)
\ No newline at end of file
+        self.filehandler.write_to_text_file(self.inbox_contents)
+        self.dirty = False
\ No newline at end of file
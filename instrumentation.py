@@ -0,0 +1,188 @@
+import json
+import math
+import time
+from config import config
+
+# Latencies are counted in buckets whose bounds grow by this factor, so each
+# percentile is estimated to within about 10%
+BUCKET_GROWTH = 2 ** 0.25
+
+# The upper bound of the first bucket, in seconds
+SMALLEST_BUCKET = 1e-6
+
+
+class LatencyHistogram():
+    """
+    Counts latencies in logarithmically sized buckets, keeping the exact
+    count, total, minimum and maximum alongside
+
+    Args:
+        None.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.minimum = None
+        self.maximum = None
+        self.buckets = {}
+
+    def record(self, seconds):
+        """
+        Adds a single latency to the histogram
+        """
+        self.count += 1
+        self.total += seconds
+
+        if self.minimum is None or seconds < self.minimum:
+            self.minimum = seconds
+
+        if self.maximum is None or seconds > self.maximum:
+            self.maximum = seconds
+
+        if seconds <= SMALLEST_BUCKET:
+            bucket = 0
+        else:
+            bucket = math.ceil(math.log(seconds / SMALLEST_BUCKET,
+                                        BUCKET_GROWTH))
+
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+    @staticmethod
+    def bucket_bound(bucket):
+        """
+        Returns the upper bound of a bucket, in seconds
+        """
+        return SMALLEST_BUCKET * BUCKET_GROWTH ** bucket
+
+    def percentile(self, percent):
+        """
+        Estimates a percentile of the latencies
+
+        Args:
+            percent (float): the percentile to estimate, from 0 to 100
+
+        Returns:
+            float: the estimate in seconds, or None if nothing was recorded
+        """
+        if not self.count:
+            return None
+
+        rank = math.ceil(self.count * percent / 100) or 1
+        seen = 0
+
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+
+            if seen >= rank:
+                # The middle of the bucket, kept within what was recorded
+                estimate = self.bucket_bound(bucket) / BUCKET_GROWTH ** 0.5
+                return min(max(estimate, self.minimum), self.maximum)
+
+        return self.maximum
+
+    def as_dict(self):
+        """
+        Returns the histogram as a dictionary that can be written as JSON
+        """
+        return {
+            'count': self.count,
+            'total': self.total,
+            'min': self.minimum,
+            'max': self.maximum,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+            'buckets': {'{:.9f}'.format(self.bucket_bound(bucket)): count
+                        for bucket, count in sorted(self.buckets.items())},
+            }
+
+
+class Instrumentation():
+    """
+    Records how long commands and storage operations take, as a latency
+    histogram for each kind of operation, mode and name. Timing is off
+    unless enabled, and when it's off each hook costs a single check.
+
+    Args:
+        enabled (bool): whether to start timing straight away, defaults to
+                        False
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.histograms = {}
+
+    def timed(self, kind, mode, name, function, *args):
+        """
+        Calls function with args, recording how long it takes if timing is
+        enabled
+
+        Args:
+            kind (str): the kind of operation, such as 'command'
+
+            mode (str): the mode or file the operation belongs to
+
+            name (str): the name of the operation
+
+            function: the function to call
+
+            *args: the arguments to call it with
+
+        Returns:
+            Whatever function returns.
+        """
+        if not self.enabled:
+            return function(*args)
+
+        start_time = time.perf_counter()
+
+        try:
+            return function(*args)
+        finally:
+            self.record(kind, mode, name, time.perf_counter() - start_time)
+
+    def record(self, kind, mode, name, seconds):
+        """
+        Adds a single latency to the histogram for an operation
+        """
+        key = (kind, mode, name)
+        histogram = self.histograms.get(key)
+
+        if histogram is None:
+            histogram = self.histograms[key] = LatencyHistogram()
+
+        histogram.record(seconds)
+
+    def reset(self):
+        """
+        Discards everything recorded so far
+        """
+        self.histograms = {}
+
+    def as_dict(self):
+        """
+        Returns everything recorded as a list of dictionaries, one for each
+        operation, that can be written as JSON
+        """
+        return [dict(kind=kind, mode=mode, name=name, **histogram.as_dict())
+                for (kind, mode, name), histogram in self.sorted_histograms()]
+
+    def sorted_histograms(self):
+        """
+        Returns each (kind, mode, name) key and its histogram, in key order
+        """
+        return sorted(self.histograms.items(),
+                      key=lambda item: tuple(str(part) for part in item[0]))
+
+    def dump(self, filename):
+        """
+        Writes everything recorded to a file as JSON
+        """
+        with open(filename, 'w') as outfile:
+            json.dump(self.as_dict(), outfile, indent=4)
+
+
+# The hooks shared by the command parser, the command handlers and the file
+# handlers
+hooks = Instrumentation(enabled=config.instrumentation)
@@ -0,0 +1,148 @@
+import itertools
+import sys
+from collections import namedtuple
+from config import config
+
+# Which part of a listing to show. The limit is the most rows to show, or
+# None for all of them, and the offset is how many rows to skip first.
+Page = namedtuple('Page', [
+    'limit',
+    'offset',
+    ])
+
+# The options that select a page, given before any other arguments
+PAGE_OPTIONS = ('--limit', '--offset')
+
+# The width of each column in a streamed listing, by field name, widened to
+# fit the field name where it's longer
+COLUMN_WIDTHS = {
+    'Index': 10,
+    'Project Index': 8,
+    'Task Index': 10,
+    'Description': 40,
+    'P Description': 30,
+    'T Description': 40,
+    'Notes': 20,
+    'P Notes': 20,
+    'Priority': 8,
+    'T Priority': 8,
+    'Created': 15,
+    'T Created': 15,
+    'Due': 15,
+    'T Due': 15,
+    'State': 8,
+    }
+
+# The width of any column not in COLUMN_WIDTHS
+DEFAULT_COLUMN_WIDTH = 14
+
+# Separates the columns of a streamed listing
+COLUMN_SEPARATOR = ' | '
+
+
+def parse_page(remaining_command):
+    """
+    Reads any --limit and --offset options from the start of a command's
+    arguments
+    
+    Args:
+        remaining_command (str): the command's arguments
+        
+    Returns:
+        tuple: the Page to show, or None for the whole listing as a single
+               table, and the arguments left after the options
+    """
+    options = {}
+
+    while remaining_command:
+        words = remaining_command.split(maxsplit=2)
+
+        if words[0] not in PAGE_OPTIONS:
+            break
+
+        if len(words) < 2 or not words[1].isdigit():
+            raise ValueError("{} needs a number of rows".format(words[0]))
+
+        options[words[0]] = int(words[1])
+        remaining_command = words[2] if len(words) > 2 else ''
+
+    if not options and not config.streaming_listings:
+        return None, remaining_command
+
+    return (Page(options.get('--limit'), options.get('--offset', 0)),
+            remaining_command)
+
+
+def format_cell(value, width):
+    """
+    Returns a value as text exactly width characters wide, cut short with a
+    trailing ~ if it doesn't fit
+    """
+    text = ' '.join(str(value).split())
+
+    if len(text) > width:
+        return text[:width - 1] + '~'
+
+    return text.ljust(width)
+
+
+def format_row(row, widths):
+    """
+    Returns a row of values as a single line of fixed width columns
+    """
+    return COLUMN_SEPARATOR.join(format_cell(value, width)
+                                 for value, width in zip(row, widths)).rstrip()
+
+
+def print_page(fields, rows, page):
+    """
+    Prints a page of a listing in fixed width columns as its rows are
+    generated, rather than building a whole table first. The column headings
+    are repeated every config.page_size rows, and output is flushed after
+    each of those pages so that the first appears straight away.
+    
+    Args:
+        fields (list): the heading of each column
+        
+        rows (iterable): the rows of the whole listing, each a list with a
+                         value for each column, generated as they're needed
+                         
+        page (Page): which rows to show
+        
+    Returns:
+        int: the number of rows shown
+    """
+    widths = [max(COLUMN_WIDTHS.get(field, DEFAULT_COLUMN_WIDTH), len(field))
+              for field in fields]
+    heading = format_row(fields, widths)
+    rule = '-' * len(heading)
+
+    # One row past the page, to tell whether there are more
+    if page.limit is None:
+        rows = itertools.islice(rows, page.offset, None)
+    else:
+        rows = itertools.islice(rows, page.offset,
+                                page.offset + page.limit + 1)
+
+    shown = 0
+
+    for row in rows:
+        if shown == page.limit:
+            print("More rows follow, use --offset {} to see them".format(
+                page.offset + shown))
+            break
+
+        if shown % config.page_size == 0:
+            if shown:
+                sys.stdout.flush()
+
+            print(heading)
+            print(rule)
+
+        print(format_row(row, widths))
+        shown += 1
+
+    if not shown and page.offset:
+        print("There are no rows from offset {}".format(page.offset))
+
+    return shown
\ No newline at end of file
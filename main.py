@@ -1,10 +1,67 @@
+import time
+
+start_time = time.perf_counter()
+
+import argparse
+import sys
 from command_parser import CommandParser
 
-cp = CommandParser()
+argument_parser = argparse.ArgumentParser(description="Command line tasks")
+argument_parser.add_argument(
+    'command', nargs='*',
+    help="a single command to run from main mode, such as 'i a buy milk', "
+         "after which everything is saved and the program exits")
+argument_parser.add_argument(
+    '--batch', metavar='FILE',
+    help="run the commands in FILE, one per line, or from standard input if "
+         "FILE is -, then save and exit")
+argument_parser.add_argument(
+    '--stop-on-error', action='store_true',
+    help="in batch mode, stop at the first command that fails")
+argument_parser.add_argument(
+    '--daemon', action='store_true',
+    help="keep everything in memory and serve commands sent by client.py "
+         "over a Unix domain socket, until interrupted")
+argument_parser.add_argument(
+    '--startup-profile', action='store_true',
+    help="report how long startup takes, and how long each mode takes to "
+         "load the first time it's used")
+arguments = argument_parser.parse_args()
+
+cp = CommandParser(startup_profile=arguments.startup_profile)
+
+if arguments.startup_profile:
+    print("Started in {:.1f} ms".format(
+        1000 * (time.perf_counter() - start_time)), file=sys.stderr)
+
+if arguments.daemon:
+    # Only imported when needed, as it isn't needed to start up otherwise
+    from daemon import serve
+    
+    serve(cp)
+    sys.exit()
+
+if arguments.command:
+    succeeded = cp.run_batch([' '.join(arguments.command)],
+                             arguments.stop_on_error)
+    sys.exit(0 if succeeded else 1)
+
+if arguments.batch is not None:
+    if arguments.batch == '-':
+        succeeded = cp.run_batch(sys.stdin, arguments.stop_on_error)
+    else:
+        with open(arguments.batch) as batch_file:
+            succeeded = cp.run_batch(batch_file, arguments.stop_on_error)
+            
+    sys.exit(0 if succeeded else 1)
+
+cp.start_autosave()
 
 while True:
     try:
-        command = input(cp.get_prompt())   
+        command = cp.read_command()
         cp.breakout(command)
     except StopIteration:
-        break
\ No newline at end of file
+        break
+
+cp.stop_autosave()
\ No newline at end of file
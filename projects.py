@@ -3,6 +3,7 @@ from config import config
 from tasks import TASK_FIELDS
 from filehandler import FileHandler
 from base import BaseCommandHandler
+from listing import parse_page, print_page
 
 PROJECT_FIELDS = ['Description', 'Notes']
 
@@ -32,6 +33,13 @@ class ProjectCommandHandler(BaseCommandHandler):
         Assigns a task manager to the project manager
         """
         self.project_manager.task_manager = task_manager
+        
+    def set_task_manager_source_on_project_manager(self, task_manager_source):
+        """
+        Gives the project manager a function to call for the task manager,
+        the first time it needs one
+        """
+        self.project_manager.task_manager_source = task_manager_source
 
     def get_project_manager(self):
         """
@@ -45,6 +53,9 @@ class ProjectCommandHandler(BaseCommandHandler):
         """
         return self.project_manager
         
+    def get_managers(self):
+        return [self.project_manager]
+        
     def close(self):
         """
         Close the project manager, for when the program exits
@@ -76,16 +87,20 @@ class ProjectCommandHandler(BaseCommandHandler):
         
     def display_all(self, remaining_command):
         """
-        Display all projects in the project manager
+        Display all projects in the project manager, or a page of them when
+        followed by --limit or --offset and a number of rows
         """
-        self.project_manager.display_all_projects()
+        page, remaining_command = parse_page(remaining_command)
+        self.project_manager.display_all_projects(page=page)
         return remaining_command
         
     def display_all_with_tasks(self, remaining_command):
         """
-        Displays all projects in the project manager with tasks
+        Displays all projects in the project manager with tasks, or a page
+        of them when followed by --limit or --offset and a number of rows
         """
-        self.project_manager.display_all_projects(with_tasks=True)
+        page, remaining_command = parse_page(remaining_command)
+        self.project_manager.display_all_projects(with_tasks=True, page=page)
         return remaining_command
         
 
@@ -94,10 +109,17 @@ class ProjectManager():
     A class that handles a list of projects in aggregate
     
     Args:
-        project_list (list): a list of all the current projects
+        task_manager (TaskManager): the task manager holding the projects'
+                                    tasks, defaults to None
+                                    
+        filehandler (FileHandler): where the projects are stored, defaults
+                                   to the project file in the config
     """
-    def __init__(self, task_manager=None):
-        self.filehandler = FileHandler(config.project_file) 
+    def __init__(self, task_manager=None, filehandler=None):
+        if filehandler is None:
+            filehandler = FileHandler(config.project_file, table='projects')
+            
+        self.filehandler = filehandler
         self.project_list = self.filehandler.parse_file()
         self.current_project_index = None
         
@@ -105,12 +127,47 @@ class ProjectManager():
         # without a task manager, but it's not expected most of the time
         self.task_manager = task_manager
         
+        # Whether anything has changed since the project list was last written
+        self.dirty = False
+        
+        # Called for the task manager when it's first needed, if it wasn't
+        # given one
+        self.task_manager_source = None
+        
+        # Kept up to date with projects as they're added, through their
+        # project_added methods
+        self.listeners = []
+        
+    @property
+    def task_manager(self):
+        if self._task_manager is None and self.task_manager_source is not None:
+            self._task_manager = self.task_manager_source()
+            
+        return self._task_manager
+        
+    @task_manager.setter
+    def task_manager(self, task_manager):
+        self._task_manager = task_manager
+        
+    def add_listener(self, listener):
+        """
+        Adds something to keep up to date with projects as they're added,
+        such as the search index
+        """
+        self.listeners.append(listener)
+        
     def add_project(self, description):
         """
         Adds a project to the manager using the description
         """
         new_project = Project(description=description)
         self.project_list.append(new_project)
+        
+        for listener in self.listeners:
+            listener.project_added(len(self.project_list) - 1, new_project)
+            
+        self.filehandler.write_item(len(self.project_list) - 1, new_project)
+        self.dirty = True
         self.current_project_index = -1
         self.display_current_project()
     
@@ -122,55 +179,118 @@ class ProjectManager():
         
         if with_tasks:
             table = PrettyTable(['Index'] + TASK_FIELDS)
+            project = self.project_list[self.current_project_index]
             
-            for task_index, task in enumerate(self.task_manager.task_list):
-                    if (self.project_list[self.current_project_index].description
-                            in task.projects):
-                        table.add_row([task_index] + task.attributes_as_list())
+            for task_index in self.task_manager.return_indices_for_project(
+                    project.description):
+                task = self.task_manager.return_task_with_index(task_index)
+                table.add_row([task_index] + task.attributes_as_list())
                         
             print(table) 
     
-    def display_all_projects(self, with_tasks=False):
+    def display_all_projects(self, with_tasks=False, page=None):
         """
         Outputs a table showing all available projects, sorted by index
         
         Args:
             with_tasks (bool): whether to show the tasks under each project
+            
+            page (Page): which rows to stream, defaults to None for a single
+                         table of them all
         
         Returns:
             None.
         """
         if with_tasks:
-            table = PrettyTable(['Project Index']
-                                + ['P {}'.format(field) 
-                                   for field in PROJECT_FIELDS]
-                                + ['Task Index']
-                                + ['T {}'.format(field)
-                                   for field in TASK_FIELDS]
-                                )
-            
-            for project_index, project in enumerate(self.project_list):
-                table_row = [project_index] + project.attributes_as_list()
-                
-                for task_index, task in enumerate(self.task_manager.task_list):
-                    if project.description in task.projects:
-                        table_row += [task_index] + task.attributes_as_list()  
-                
-                table.add_row(table_row)
+            fields = (['Project Index']
+                      + ['P {}'.format(field) for field in PROJECT_FIELDS]
+                      + ['Task Index']
+                      + ['T {}'.format(field) for field in TASK_FIELDS])
+            rows = self.__generate_rows_with_tasks()
         else:    
-            table = PrettyTable(['Index'] + PROJECT_FIELDS + ['State'])
+            fields = ['Index'] + PROJECT_FIELDS + ['State']
+            rows = ([index] + project.attributes_as_list() + [project.state]
+                    for index, project in enumerate(self.project_list))
+                    
+        if page is not None:
+            print_page(fields, rows, page)
+            return None
             
-            for index, project in enumerate(self.project_list):
-                table.add_row([index] + project.attributes_as_list() + 
-                              [project.state])            
+        table = PrettyTable(fields)
+        
+        for row in rows:
+            table.add_row(row)
         
         print(table)
         
+    def __generate_rows_with_tasks(self):
+        """
+        Generates a row for each task in each project, with the project
+        itself only shown on the first of them, and a row for each project
+        without tasks
+        """
+        blank_project = [''] * (len(PROJECT_FIELDS) + 1)
+        blank_task = [''] * (len(TASK_FIELDS) + 1)
+
+        for project_index, project in enumerate(self.project_list):
+            project_columns = [project_index] + project.attributes_as_list()
+            task_indices = self.task_manager.return_indices_for_project(
+                project.description)
+            
+            if not task_indices:
+                yield project_columns + blank_task
+            
+            for task_index in task_indices:
+                task = self.task_manager.return_task_with_index(task_index)
+                yield (project_columns + [task_index]
+                       + task.attributes_as_list())
+                project_columns = blank_project
+        
+    def display_projects_by_index(self, index_list):
+        """
+        Outputs a table showing the projects with the indices specified, in
+        the order given
+        """
+        table = PrettyTable(['Index'] + PROJECT_FIELDS + ['State'])
+        
+        for index in index_list:
+            project = self.project_list[index]
+            table.add_row([index] + project.attributes_as_list()
+                          + [project.state])
+                          
+        print(table)
+        
+    def compact(self):
+        """
+        Rewrites the project file in full, folding in any journalled changes
+        
+        Returns:
+            SnapshotReport: what was written and how long it took
+        """
+        report = self.filehandler.compact(self.project_list)
+        self.dirty = False
+        return report
+        
+    def autosave(self):
+        """
+        Writes the current state to file if anything has changed since it
+        was last written
+        
+        Returns:
+            bool: whether anything was written
+        """
+        if not self.dirty:
+            return False
+            
+        self.close()
+        return True
+
     def close(self):
         """
         Closes the project manager by writing the current state to file
         """
         self.filehandler.write_to_file(self.project_list)
+        self.dirty = False
 
 
 class Project():
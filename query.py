@@ -0,0 +1,664 @@
+import operator
+import re
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+# How many compiled queries are kept, by query text
+QUERY_CACHE_SIZE = 64
+
+# The most levels of brackets and 'not's a query can nest
+MAX_NESTING = 50
+
+# Splits a query into quoted strings, operators and brackets, and words
+TOKEN = re.compile(r'\s*(?:"(?P<string>[^"]*)"'
+                   r'|(?P<symbol><=|>=|!=|[<>=:()])'
+                   r'|(?P<word>[^\s()<>=!:"]+))')
+
+# The comparison each operator makes. ':' and '=' both test equality, or
+# membership for fields holding several names.
+COMPARISONS = {
+    ':': operator.eq,
+    '=': operator.eq,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    }
+
+# The field each name in a query refers to
+FIELD_NAMES = {
+    'priority': 'priority',
+    'state': 'state',
+    'due': 'due',
+    'created': 'created',
+    'project': 'projects',
+    'projects': 'projects',
+    'context': 'contexts',
+    'contexts': 'contexts',
+    'description': 'description',
+    }
+
+# The flags that can be used on their own, as the field and value they test
+FLAGS = {
+    'blocked': ('blocked', True),
+    'active': ('active', True),
+    'open': ('state', 'open'),
+    'closed': ('state', 'closed'),
+    }
+
+# The date formats a query can give dates in
+DATE_FORMATS = ("%Y-%m-%d", "%d %b %y")
+
+# The dates that depend on the day a query is run, so are only turned into
+# a day when it runs
+RELATIVE_DATES = ('today',)
+
+
+class QueryError(Exception):
+    """
+    Raised when a query can't be parsed
+    """
+
+
+def compile_query(text):
+    """
+    Parses a query into a Query that can be run against a task manager.
+    Compiled queries are cached by their text, so running the same query
+    again skips parsing.
+
+    A query is made of terms such as priority<=2, context:office,
+    due<2026-11-01 or blocked, combined with 'and', 'or', 'not' and
+    brackets. 'and' binds more tightly than 'or'.
+
+    Args:
+        text (str): the query
+
+    Returns:
+        Query: the compiled query
+
+    Raises:
+        QueryError: if the query can't be parsed
+    """
+    text = text.strip()
+    query = compiled_queries.get(text)
+
+    if query is None:
+        query = Query(text, Parser(tokenise(text)).parse())
+
+        if len(compiled_queries) >= QUERY_CACHE_SIZE:
+            compiled_queries.popitem(last=False)
+
+        compiled_queries[text] = query
+    else:
+        compiled_queries.move_to_end(text)
+
+    return query
+
+
+# The most recently used compiled queries, by query text, oldest first
+compiled_queries = OrderedDict()
+
+
+def tokenise(text):
+    """
+    Splits a query into tokens
+
+    Returns:
+        list: each token as a (kind, text) tuple, where the kind is 'string',
+              'symbol' or 'word'
+    """
+    tokens = []
+    position = 0
+    text = text.rstrip()
+
+    while position < len(text):
+        match = TOKEN.match(text, position)
+
+        if match is None:
+            raise QueryError("Can't understand the query from: "
+                             + text[position:].strip())
+
+        tokens.append((match.lastgroup, match.group(match.lastgroup)))
+        position = match.end()
+
+    return tokens
+
+
+def start_of_today():
+    """
+    Returns the start of the current day, as a datetime
+    """
+    return datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def parse_date(value):
+    """
+    Returns the timestamps of the start of a day given in the query, and of
+    the start of the day after. A relative date is the day it is now.
+    """
+    if value.lower() == 'today':
+        day = start_of_today()
+    else:
+        for date_format in DATE_FORMATS:
+            try:
+                day = datetime.strptime(value, date_format)
+                break
+            except ValueError:
+                continue
+        else:
+            raise QueryError("Can't understand the date " + value)
+
+    return (int(day.timestamp()),
+            int((day + timedelta(days=1)).timestamp()))
+
+
+class Parser():
+    """
+    Parses a list of query tokens into a tree of query nodes
+
+    Args:
+        tokens (list): the tokens, as returned by tokenise
+    """
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.position = 0
+        self.nesting = 0
+
+    def parse(self):
+        """
+        Returns the node at the top of the parsed query
+        """
+        if not self.tokens:
+            raise QueryError("The query is empty")
+
+        node = self.parse_or()
+
+        if self.position < len(self.tokens):
+            raise QueryError("Unexpected " + self.tokens[self.position][1])
+
+        return node
+
+    def peek(self):
+        """
+        Returns the next token without consuming it, or (None, None) at the
+        end of the query
+        """
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+
+        return None, None
+
+    def take(self):
+        """
+        Consumes and returns the next token
+        """
+        if self.position >= len(self.tokens):
+            raise QueryError("The query ends too soon")
+
+        self.position += 1
+        return self.tokens[self.position - 1]
+
+    def is_keyword(self, keyword):
+        """
+        Whether the next token is the given keyword
+        """
+        kind, text = self.peek()
+        return kind == 'word' and text.lower() == keyword
+
+    def parse_or(self):
+        children = [self.parse_and()]
+
+        while self.is_keyword('or'):
+            self.take()
+            children.append(self.parse_and())
+
+        return children[0] if len(children) == 1 else Or(children)
+
+    def parse_and(self):
+        children = [self.parse_not()]
+
+        while self.is_keyword('and'):
+            self.take()
+            children.append(self.parse_not())
+
+        return children[0] if len(children) == 1 else And(children)
+
+    def parse_not(self):
+        negations = 0
+
+        while self.is_keyword('not'):
+            self.take()
+            negations += 1
+
+        node = self.parse_atom()
+
+        # Double negatives cancel out
+        return Not(node) if negations % 2 else node
+
+    def parse_atom(self):
+        kind, text = self.take()
+
+        if kind == 'symbol' and text == '(':
+            self.nesting += 1
+
+            if self.nesting > MAX_NESTING:
+                raise QueryError("The query has too many brackets")
+
+            node = self.parse_or()
+
+            if self.take() != ('symbol', ')'):
+                raise QueryError("A bracket isn't closed")
+
+            self.nesting -= 1
+            return node
+
+        if kind != 'word':
+            raise QueryError("Unexpected " + text)
+
+        next_kind, operator_text = self.peek()
+
+        if next_kind == 'symbol' and operator_text not in ('(', ')'):
+            self.take()
+            value_kind, value = self.take()
+
+            if value_kind == 'symbol':
+                raise QueryError("Expected a value after " + text
+                                 + operator_text)
+
+            return make_term(text.lower(), operator_text, value)
+
+        if text.lower() not in FLAGS:
+            raise QueryError("Unknown term " + text)
+
+        field, value = FLAGS[text.lower()]
+        return IndexedTerm(field, field, lambda key: key == value,
+                           single_valued=True, keys=(value,))
+
+
+def make_term(name, operator_text, value):
+    """
+    Returns the query node testing a field against a value
+
+    Args:
+        name (str): the name of the field, as given in the query
+
+        operator_text (str): the comparison, one of ':', '=', '!=', '<',
+                             '<=', '>' or '>='
+
+        value (str): the value to compare with
+
+    Returns:
+        The query node.
+    """
+    if name not in FIELD_NAMES:
+        raise QueryError("Unknown field " + name)
+
+    if operator_text == '!=':
+        return Not(make_term(name, '=', value))
+
+    field = FIELD_NAMES[name]
+    compare = COMPARISONS[operator_text]
+    is_equality = operator_text in (':', '=')
+
+    if field == 'priority':
+        try:
+            value = int(value)
+        except ValueError:
+            raise QueryError("Priorities are numbers, not " + value)
+
+        return IndexedTerm(field, field, lambda key: compare(key, value),
+                           single_valued=True,
+                           keys=(value,) if is_equality else None)
+
+    if field in ('due', 'created'):
+        return DateTerm(field, operator_text, value)
+
+    if not is_equality:
+        raise QueryError("Only : = and != can be used with " + name)
+
+    if field == 'description':
+        return DescriptionTerm(value)
+
+    if field == 'state':
+        value = value.lower()
+
+    return IndexedTerm(field, field, lambda key: key == value,
+                       single_valued=(field == 'state'), keys=(value,))
+
+
+################################################################################
+# Query nodes
+################################################################################
+# Each node has a predicate, a function that says whether a task matches, the
+# set of task attributes the predicate reads, and a plan, which uses the task
+# index to find the unique IDs of the tasks that might match without looking
+# at each task. A plan returns a set of unique IDs or None when the index
+# can't narrow things down, along with whether the set is exactly the tasks
+# that match. The negated plan does the same for the tasks that don't match.
+# A node is relative when what it matches depends on the day it's run.
+
+class IndexedTerm():
+    """
+    A term that can be answered from one of the task indexes
+
+    Args:
+        field (str): the task attribute the term tests
+
+        index_name (str): the index filing tasks by that attribute
+
+        test (function): given a key of the index, whether tasks filed under
+                         it match
+
+        single_valued (bool): whether each task is filed under exactly one
+                              key, so that the tasks that don't match are
+                              those under every other key
+
+        keys (tuple): the keys that match, when they're known without
+                      looking at the index, defaults to None
+    """
+    # The task attributes each index's keys are derived from
+    ATTRIBUTES = {
+        'state': ('state',),
+        'priority': ('priority',),
+        'projects': ('projects',),
+        'contexts': ('contexts',),
+        'blocked': ('blocked_until',),
+        'active': ('state', 'blocked_until'),
+        }
+
+    # How to read the keys a task is filed under, as for TaskIndex
+    TASK_KEYS = {
+        'state': lambda task: (task.state,),
+        'priority': lambda task: (task._priority,),
+        'projects': lambda task: task._projects,
+        'contexts': lambda task: task._contexts,
+        'blocked': lambda task: (task.is_blocked,),
+        'active': lambda task: (task.state != 'closed'
+                                and not task.is_blocked,),
+        }
+
+    def __init__(self, field, index_name, test, single_valued, keys=None):
+        self.index_name = index_name
+        self.test = test
+        self.single_valued = single_valued
+        self.keys = keys
+        self.attributes = frozenset(self.ATTRIBUTES[field])
+        self.relative = False
+        task_keys = self.TASK_KEYS[field]
+        self.predicate = lambda task: any(test(key) for key in task_keys(task))
+
+    def plan(self, task_index):
+        if self.keys is not None:
+            keys = self.keys
+        else:
+            keys = [key for key in task_index.keys(self.index_name)
+                    if self.test(key)]
+
+        return self.__unite(task_index, keys), True
+
+    def negated_plan(self, task_index):
+        if not self.single_valued:
+            return None, False
+
+        keys = [key for key in task_index.keys(self.index_name)
+                if not self.test(key)]
+
+        return self.__unite(task_index, keys), True
+
+    def __unite(self, task_index, keys):
+        """
+        Returns the unique IDs filed under any of the keys
+        """
+        unique_id_sets = [task_index.lookup(self.index_name, key)
+                          for key in keys]
+
+        if len(unique_id_sets) == 1:
+            return unique_id_sets[0]
+
+        return set().union(*unique_id_sets)
+
+
+class DateTerm():
+    """
+    A term comparing the due or created date of tasks with a day. Tasks
+    without the date never match. A relative date such as 'today' is worked
+    out again whenever the day it stood for has passed, so a compiled query
+    kept overnight still means the current day.
+
+    Args:
+        field (str): 'due' or 'created'
+
+        operator_text (str): the comparison
+
+        value (str): the day, as given in the query
+    """
+    # Each comparison with a day as a range of timestamps, from the start
+    # of the day and the start of the next day
+    RANGES = {
+        ':': lambda start, end: (start, end),
+        '=': lambda start, end: (start, end),
+        '<': lambda start, end: (None, start),
+        '<=': lambda start, end: (None, end),
+        '>': lambda start, end: (end, None),
+        '>=': lambda start, end: (start, None),
+        }
+
+    def __init__(self, field, operator_text, value):
+        attribute = '_' + field
+        make_range = self.RANGES[operator_text]
+        self.attributes = frozenset((field,))
+        self.relative = value.lower() in RELATIVE_DATES
+
+        # The range of timestamps that match, and for a relative date the
+        # timestamp at which it has to be worked out again
+        day_start, next_day_start = parse_date(value)
+        day_range = [make_range(day_start, next_day_start),
+                     next_day_start if self.relative else None]
+
+        def predicate(task):
+            timestamp = getattr(task, attribute)
+
+            if timestamp is None:
+                return False
+
+            if day_range[1] is not None and time.time() >= day_range[1]:
+                day_start, next_day_start = parse_date(value)
+                day_range[:] = [make_range(day_start, next_day_start),
+                                next_day_start]
+
+            lowest, beyond = day_range[0]
+
+            return ((lowest is None or timestamp >= lowest)
+                    and (beyond is None or timestamp < beyond))
+
+        self.predicate = predicate
+
+    def plan(self, task_index):
+        return None, False
+
+    def negated_plan(self, task_index):
+        return None, False
+
+
+class DescriptionTerm():
+    """
+    A term matching tasks whose description contains some text, ignoring
+    case
+
+    Args:
+        text (str): the text to look for
+    """
+
+    def __init__(self, text):
+        text = text.lower()
+        self.attributes = frozenset(('description',))
+        self.relative = False
+        self.predicate = lambda task: text in task.description.lower()
+
+    def plan(self, task_index):
+        return None, False
+
+    def negated_plan(self, task_index):
+        return None, False
+
+
+class Not():
+    """
+    Matches the tasks its child doesn't
+    """
+
+    def __init__(self, child):
+        self.child = child
+        self.attributes = child.attributes
+        self.relative = child.relative
+        child_predicate = child.predicate
+        self.predicate = lambda task: not child_predicate(task)
+
+    def plan(self, task_index):
+        return self.child.negated_plan(task_index)
+
+    def negated_plan(self, task_index):
+        return self.child.plan(task_index)
+
+
+class And():
+    """
+    Matches the tasks all of its children match
+    """
+
+    def __init__(self, children):
+        self.children = children
+        self.attributes = frozenset().union(*(child.attributes
+                                              for child in children))
+        self.relative = any(child.relative for child in children)
+        predicates = [child.predicate for child in children]
+        self.predicate = lambda task: all(predicate(task)
+                                          for predicate in predicates)
+
+    def plan(self, task_index):
+        return intersect_plans([child.plan(task_index)
+                                for child in self.children])
+
+    def negated_plan(self, task_index):
+        return unite_plans([child.negated_plan(task_index)
+                            for child in self.children])
+
+
+class Or():
+    """
+    Matches the tasks any of its children match
+    """
+
+    def __init__(self, children):
+        self.children = children
+        self.attributes = frozenset().union(*(child.attributes
+                                              for child in children))
+        self.relative = any(child.relative for child in children)
+        predicates = [child.predicate for child in children]
+        self.predicate = lambda task: any(predicate(task)
+                                          for predicate in predicates)
+
+    def plan(self, task_index):
+        return unite_plans([child.plan(task_index)
+                            for child in self.children])
+
+    def negated_plan(self, task_index):
+        return intersect_plans([child.negated_plan(task_index)
+                                for child in self.children])
+
+
+def intersect_plans(plans):
+    """
+    Combines the plans of terms that must all match. Any of them that the
+    index can answer narrows the tasks down, smallest first.
+    """
+    unique_id_sets = sorted((unique_ids for unique_ids, exact in plans
+                             if unique_ids is not None), key=len)
+
+    if not unique_id_sets:
+        return None, False
+
+    exact = all(unique_ids is not None and exact
+                for unique_ids, exact in plans)
+
+    return unique_id_sets[0].intersection(*unique_id_sets[1:]), exact
+
+
+def unite_plans(plans):
+    """
+    Combines the plans of terms any of which can match, which needs the
+    index to answer all of them
+    """
+    if any(unique_ids is None for unique_ids, exact in plans):
+        return None, False
+
+    return (set().union(*(unique_ids for unique_ids, exact in plans)),
+            all(exact for unique_ids, exact in plans))
+
+################################################################################
+
+
+class Query():
+    """
+    A compiled query, with the predicate, attributes, plan and relativeness
+    of the node at its top
+
+    Args:
+        text (str): the query
+
+        node: the node at the top of the parsed query
+    """
+
+    def __init__(self, text, node):
+        self.text = text
+        self.predicate = node.predicate
+        self.attributes = node.attributes
+        self.plan = node.plan
+        self.relative = node.relative
+
+    def run(self, task_manager):
+        """
+        Finds the tasks matching the query, narrowing them down through the
+        task index where the plan allows and checking each remaining task
+        against the predicate unless the plan was exact
+
+        Args:
+            task_manager (TaskManager): the tasks to search
+
+        Returns:
+            list: the indices of the matching tasks, in index order
+        """
+        task_list = task_manager.task_list
+        unique_ids, exact = self.plan(task_manager.task_index)
+
+        if unique_ids is None:
+            return [index for index, task in enumerate(task_list)
+                    if self.predicate(task)]
+
+        indices = sorted(task_manager.unique_id_index[unique_id]
+                         for unique_id in unique_ids)
+
+        if exact:
+            return indices
+
+        return [index for index in indices if self.predicate(task_list[index])]
+
+    def find_unique_ids(self, task_manager):
+        """
+        Returns a new set of the unique IDs of the tasks matching the query,
+        found as for run
+        """
+        unique_ids, exact = self.plan(task_manager.task_index)
+
+        if unique_ids is None:
+            return {task.unique_id for task in task_manager.task_list
+                    if self.predicate(task)}
+
+        if exact:
+            return set(unique_ids)
+
+        return {unique_id for unique_id in unique_ids
+                if self.predicate(
+                    task_manager.return_task_with_unique_id(unique_id))}
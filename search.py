@@ -0,0 +1,377 @@
+import math
+import os
+import pickle
+import re
+from config import config
+
+# Splits text into the words that are indexed and searched for
+WORD = re.compile(r'\w+')
+
+# The format of the search file, changed whenever the way it's written does
+# so that older files are rebuilt rather than misread
+FORMAT = 1
+
+# How much a word found inside a longer word counts, compared with finding
+# the word itself
+SUBSTRING_WEIGHT = 0.5
+
+
+def words_in(text):
+    """
+    Returns the words in some text, in lower case
+    """
+    return [word.lower() for word in WORD.findall(text)]
+
+
+def trigrams_in(word):
+    """
+    Returns the set of three letter sequences in a word
+    """
+    return {word[start:start + 3] for start in range(len(word) - 2)}
+
+
+def project_text(project):
+    """
+    Returns the text of a project that is searched, its description and
+    notes
+    """
+    return ' '.join([project.description]
+                    + [str(note) for note in project.notes])
+
+
+class InvertedIndex():
+    """
+    Maps each word to the documents containing it, along with how many times
+    it appears in each. With trigrams, each three letter sequence is also
+    mapped to the words containing it, so that words containing a search
+    term can be found without looking through every word.
+
+    Args:
+        trigrams (bool): whether to index trigrams, for substring matching,
+                         defaults to True
+    """
+
+    def __init__(self, trigrams=True):
+        self.use_trigrams = trigrams
+
+        # The number of times each word appears in each document, by word
+        # and then by document key
+        self.postings = {}
+
+        # The distinct words in each document, by document key
+        self.documents = {}
+
+        # The words containing each trigram
+        self.trigrams = {}
+
+    def __len__(self):
+        return len(self.documents)
+
+    def add_document(self, key, text):
+        """
+        Indexes the text of a document, replacing whatever was indexed for
+        the same key before
+
+        Args:
+            key: identifies the document, and must be hashable
+
+            text (str): the text to index
+
+        Returns:
+            None.
+        """
+        self.remove_document(key)
+        counts = {}
+
+        for word in words_in(text):
+            counts[word] = counts.get(word, 0) + 1
+
+        if not counts:
+            return None
+
+        self.documents[key] = tuple(counts)
+
+        for word, count in counts.items():
+            postings = self.postings.get(word)
+
+            if postings is None:
+                postings = self.postings[word] = {}
+                self.__add_trigrams(word)
+
+            postings[key] = count
+
+    def remove_document(self, key):
+        """
+        Removes a document from the index, if it's there
+        """
+        for word in self.documents.pop(key, ()):
+            postings = self.postings[word]
+            del postings[key]
+
+            if not postings:
+                del self.postings[word]
+                self.__remove_trigrams(word)
+
+    def restore(self, postings, documents):
+        """
+        Replaces the contents of the index with postings and documents saved
+        from another index, rebuilding the trigrams from them
+        """
+        self.postings = postings
+        self.documents = documents
+        self.trigrams = {}
+
+        for word in postings:
+            self.__add_trigrams(word)
+
+    def __add_trigrams(self, word):
+        if self.use_trigrams:
+            for trigram in trigrams_in(word):
+                self.trigrams.setdefault(trigram, set()).add(word)
+
+    def __remove_trigrams(self, word):
+        if self.use_trigrams:
+            for trigram in trigrams_in(word):
+                words = self.trigrams[trigram]
+                words.discard(word)
+
+                if not words:
+                    del self.trigrams[trigram]
+
+    def matching_words(self, term):
+        """
+        Returns the indexed words a search term matches, each with how much
+        it counts: the term itself counts in full, and with trigrams any
+        longer word containing the term counts SUBSTRING_WEIGHT
+
+        Args:
+            term (str): a single word, in lower case
+
+        Returns:
+            dict: the weight of each matching word
+        """
+        matches = {}
+
+        if term in self.postings:
+            matches[term] = 1.0
+
+        if self.use_trigrams and len(term) >= 3:
+            word_sets = sorted((self.trigrams.get(trigram, frozenset())
+                                for trigram in trigrams_in(term)), key=len)
+
+            # Every word holding all of the term's trigrams is a candidate,
+            # but only those holding the term itself match
+            for word in word_sets[0].intersection(*word_sets[1:]):
+                if word != term and term in word:
+                    matches[word] = SUBSTRING_WEIGHT
+
+        return matches
+
+    def search(self, text):
+        """
+        Finds the documents matching every word of some text, best first.
+        Each word scores by how often the document contains it, weighted so
+        that words found in fewer documents count for more.
+
+        Args:
+            text (str): the words to search for
+
+        Returns:
+            list: the keys of the matching documents, best match first
+        """
+        terms = list(dict.fromkeys(words_in(text)))
+        scores = None
+
+        for term in terms:
+            term_scores = {}
+
+            for word, weight in self.matching_words(term).items():
+                postings = self.postings[word]
+                rarity = math.log(1 + len(self.documents) / len(postings))
+
+                # A document scores for its best matching word
+                for key, count in postings.items():
+                    score = weight * count * rarity
+
+                    if score > term_scores.get(key, 0):
+                        term_scores[key] = score
+
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {key: scores[key] + score
+                          for key, score in term_scores.items()
+                          if key in scores}
+
+            if not scores:
+                return []
+
+        if scores is None:
+            return []
+
+        return sorted(scores, key=lambda key: (-scores[key], key))
+
+
+class SearchManager():
+    """
+    Searches task descriptions and project descriptions and notes through
+    an inverted index. The index is kept up to date as tasks and projects
+    are added and task descriptions change, and is saved in the search file.
+    It's only loaded from there when the task and project files haven't
+    changed since it was saved, and is rebuilt otherwise.
+
+    Args:
+        task_manager (TaskManager): the tasks to search
+
+        project_manager (ProjectManager): the projects to search
+
+        filename (str): the search file, defaults to the one in the config
+    """
+
+    def __init__(self, task_manager, project_manager, filename=None):
+        self.task_manager = task_manager
+        self.project_manager = project_manager
+        self.filename = filename or config.search_file
+
+        # Whether the index has changed since it was last saved
+        self.dirty = False
+
+        # The signature of the task and project files the saved index was
+        # up to date with
+        self.saved_signature = None
+
+        self.index = self.__load()
+
+        if self.index is None:
+            self.rebuild()
+
+        task_manager.add_listener(self)
+        project_manager.add_listener(self)
+
+    def signature(self):
+        """
+        Returns a summary of the task and project files that changes
+        whenever they do
+        """
+        return (self.task_manager.filehandler.signature(),
+                self.project_manager.filehandler.signature())
+
+    def __load(self):
+        """
+        Returns the index saved in the search file, or None if there isn't
+        one that's up to date
+        """
+        try:
+            with open(self.filename, 'rb') as infile:
+                contents = pickle.load(infile)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+
+        if (contents.get('format') != FORMAT
+                or contents.get('trigrams') != config.search_trigrams
+                or contents.get('signature') != self.signature()):
+            return None
+
+        index = InvertedIndex(config.search_trigrams)
+        index.restore(contents['postings'], contents['documents'])
+        self.saved_signature = contents['signature']
+
+        return index
+
+    def rebuild(self):
+        """
+        Discards the index and rebuilds it from every task and project
+        """
+        self.index = InvertedIndex(config.search_trigrams)
+
+        for task in self.task_manager.task_list:
+            self.index.add_document(('task', task.unique_id),
+                                    task.description)
+
+        for position, project in enumerate(self.project_manager.project_list):
+            self.index.add_document(('project', position),
+                                    project_text(project))
+
+        self.dirty = True
+
+    ############################################################################
+    # Listening for changes
+    ############################################################################
+    def task_added(self, task):
+        self.index.add_document(('task', task.unique_id), task.description)
+        self.dirty = True
+
+    def task_changed(self, task, attribute):
+        if attribute == 'description':
+            self.task_added(task)
+
+    def tasks_reindexed(self):
+        self.rebuild()
+
+    def project_added(self, position, project):
+        self.index.add_document(('project', position), project_text(project))
+        self.dirty = True
+
+    ############################################################################
+
+    def search(self, text):
+        """
+        Finds the tasks and projects matching every word of some text
+
+        Args:
+            text (str): the words to search for
+
+        Returns:
+            tuple: the indices of the matching tasks and of the matching
+                   projects, each best match first
+        """
+        task_indices = []
+        project_indices = []
+
+        for kind, identifier in self.index.search(text):
+            if kind == 'project':
+                project_indices.append(identifier)
+            else:
+                task_index = self.task_manager.return_index_for_unique_id(
+                    identifier)
+
+                if task_index is not None:
+                    task_indices.append(task_index)
+
+        return task_indices, project_indices
+
+    def autosave(self):
+        """
+        Writes the index to file if it has changed, or if the task or project
+        files have, since it was last written
+
+        Returns:
+            bool: whether anything was written
+        """
+        if not self.dirty and self.saved_signature == self.signature():
+            return False
+
+        self.close()
+        return True
+
+    def close(self):
+        """
+        Writes the index to the search file, along with the signature of the
+        task and project files it's up to date with
+        """
+        signature = self.signature()
+        contents = {
+            'format': FORMAT,
+            'trigrams': config.search_trigrams,
+            'signature': signature,
+            'postings': self.index.postings,
+            'documents': self.index.documents,
+            }
+        temporary_filename = self.filename + '.tmp'
+
+        with open(temporary_filename, 'wb') as outfile:
+            pickle.dump(contents, outfile, protocol=config.pickle_protocol)
+
+        os.replace(temporary_filename, self.filename)
+        self.saved_signature = signature
+        self.dirty = False
\ No newline at end of file
@@ -0,0 +1,925 @@
+import lzma
+import os
+import pickle
+import time
+import zlib
+from contextlib import nullcontext
+from collections import namedtuple
+from config import config
+from utilities import normalise_unique_id
+
+# A compact summary of a stored task, enough to index it without building it.
+# The offset locates the full record within the backend's storage. The
+# subtask IDs are None in headers written before they were kept there.
+ItemHeader = namedtuple('ItemHeader', [
+    'unique_id',
+    'state',
+    'priority',
+    'blocked',
+    'offset',
+    'subtask_ids',
+    ], defaults=[None])
+
+# What was written by a full save of the data
+SnapshotReport = namedtuple('SnapshotReport', [
+    'filename',
+    'size',
+    'seconds',
+    ])
+
+# The (compress, decompress) functions for each supported compression
+COMPRESSORS = {
+    None: (bytes, bytes),
+    'zlib': (zlib.compress, zlib.decompress),
+    'lzma': (lzma.compress, lzma.decompress),
+    }
+
+def task_header(task, offset=None):
+    """
+    Returns the header summarising a task
+
+    Args:
+        task (Task): the task to summarise
+
+        offset: where the task's record is stored, defaults to None
+
+    Returns:
+        ItemHeader: the summary of the task
+    """
+    return ItemHeader(task.unique_id, task.state, int(task.priority),
+                      task.is_blocked, offset, tuple(task.subtask_ids))
+
+
+class StorageBackend():
+    """
+    Base class for the storage behind a FileHandler. The data is a list of
+    items, each identified by its position in the list.
+    """
+
+    def load(self):
+        """
+        Returns every stored item, in position order
+        """
+        raise NotImplementedError
+
+    def load_item(self, position):
+        """
+        Returns the single item stored at position
+        """
+        raise NotImplementedError
+
+    def count(self):
+        """
+        Returns the number of stored items
+        """
+        raise NotImplementedError
+
+    def save(self, data):
+        """
+        Replaces everything stored with the items in data, returning a
+        SnapshotReport
+        """
+        raise NotImplementedError
+
+    def save_item(self, position, item):
+        """
+        Stores a single new or changed item at position
+        """
+        raise NotImplementedError
+
+    def save_items(self, items):
+        """
+        Stores several new or changed items, given as (position, item)
+        pairs, which backends can do at less cost than one at a time
+        """
+        for position, item in items:
+            self.save_item(position, item)
+
+    def compact(self, data):
+        """
+        Rewrites the stored data as compactly as possible, folding in any
+        separately saved items, and returns a SnapshotReport
+        """
+        return self.save(data)
+
+    def load_lazy(self):
+        """
+        Returns a LazyItemList over the stored items, reading only their
+        headers now and each full item the first time it is accessed
+        """
+        raise NotImplementedError
+
+    def files(self):
+        """
+        Returns the files the data is kept in, at least one of which changes
+        whenever the data does
+        """
+        raise NotImplementedError
+
+    def load_from_header(self, header):
+        """
+        Returns the full item summarised by header
+        """
+        raise NotImplementedError
+
+
+class LazyItemList():
+    """
+    A list of stored items that holds only their headers until each item is
+    first accessed, at which point it is loaded from the backend and kept.
+    Supports the parts of the list interface the managers use.
+
+    Args:
+        backend (StorageBackend): the backend the items are stored in
+
+        headers (list): an ItemHeader for each stored item
+
+        items (dict): items that are already loaded, by position, defaults
+                      to None
+    """
+
+    def __init__(self, backend, headers, items=None):
+        self.backend = backend
+        self.headers = headers
+        self.items = [None] * len(headers)
+
+        # Called with each item as it is loaded, if set
+        self.on_load = None
+
+        for position, item in (items or {}).items():
+            self.items[position] = item
+
+    def __len__(self):
+        return len(self.items)
+
+    def __getitem__(self, position):
+        item = self.items[position]
+
+        if item is None:
+            item = self.backend.load_from_header(self.headers[position])
+            self.items[position] = item
+
+            if self.on_load is not None:
+                self.on_load(item)
+
+        return item
+
+    def __setitem__(self, position, item):
+        self.items[position] = item
+
+    def __iter__(self):
+        for position in range(len(self.items)):
+            yield self[position]
+
+    def append(self, item):
+        """
+        Adds a new item, which has no header until it is saved
+        """
+        self.headers.append(None)
+        self.items.append(item)
+
+    def is_loaded(self, position):
+        """
+        Returns whether the item at position has been loaded
+        """
+        return self.items[position] is not None
+
+    def loaded_items(self):
+        """
+        Returns the items loaded so far, without loading any more
+        """
+        return [item for item in self.items if item is not None]
+
+
+class PickleBackend(StorageBackend):
+    """
+    Stores the data as a pickle file. The file starts with a pickled header
+    block holding an ItemHeader for each item, followed by each item pickled
+    separately, so that single items can be read without reading the rest.
+    The header list and each item may be compressed. Files in the older
+    format of a single pickled {'data': [...]} dictionary are still read, and
+    are rewritten in the new format on the next save.
+
+    Saves write a temporary file next to the pickle file, sync it to disk and
+    then rename it over the pickle file, so an interrupted save leaves the
+    previous file intact.
+
+    In journal mode every change is also appended to a journal file next to
+    the pickle file, and the journal is replayed on top of the pickle when it
+    is next loaded, so that changes survive a crash before the next full
+    save. Without a journal, changed items are only written by save.
+
+    Args:
+        filename (str): the pickle file to use
+
+        journal (bool): whether to use journal mode, defaults to False
+
+        table (str): the kind of item stored, where 'tasks' gives headers
+                     full task summaries, defaults to None
+
+        protocol (int): the pickle protocol to write with, defaults to
+                        pickle.DEFAULT_PROTOCOL
+
+        compression (str): None, 'zlib' or 'lzma', defaults to None
+    """
+    FORMAT = 2
+
+    def __init__(self, filename, journal=False, table=None,
+                 protocol=pickle.DEFAULT_PROTOCOL, compression=None):
+        self.filename = filename
+        self.journal = journal
+        self.journal_filename = filename + '.journal'
+        self.table = table
+        self.protocol = protocol
+        self.compression = compression
+
+        # Where the records start in the file, where each record ends and how
+        # they are compressed, as of the last time the file was read or
+        # written
+        self.records_start = 0
+        self.record_ends = {}
+        self.file_compression = None
+
+    def load(self):
+        """
+        Parses the pickle file and returns its contents
+
+        Args:
+            None.
+
+        Returns:
+            list: all the items in the file, with any journalled changes
+                  applied
+        """
+        data = self.parse_snapshot()
+
+        if self.journal:
+            self.replay_journal(data)
+
+        return data
+
+    def load_item(self, position):
+        return self.load()[position]
+
+    def count(self):
+        return len(self.load())
+
+    def load_lazy(self):
+        """
+        Reads the header block of the pickle file, plus any journalled
+        changes, and returns a LazyItemList over the items
+
+        Args:
+            None.
+
+        Returns:
+            LazyItemList: the items in the file, loaded on demand
+        """
+        headers, items = self.__parse_headers()
+
+        if self.journal:
+            for position, item in self.journal_records():
+                if position < len(headers):
+                    items[position] = item
+                else:
+                    headers.append(None)
+                    items[len(headers) - 1] = item
+
+        return LazyItemList(self, headers, items)
+
+    def load_from_header(self, header):
+        """
+        Reads and returns the single item whose record starts at the header's
+        offset
+        """
+        with open(self.filename, 'rb') as infile:
+            return pickle.loads(self.__read_record(infile, header))
+
+    def parse_snapshot(self):
+        """
+        Parses the contents of the pickle file, ignoring the journal
+
+        Args:
+            None.
+
+        Returns:
+            list: all the items in the file
+        """
+        try:
+            with open(self.filename, 'rb') as infile:
+                headers = self.__read_header_block(infile)
+
+                if isinstance(headers, dict):
+                    return headers['data']
+
+                return [pickle.loads(self.__read_record(infile, header))
+                        for header in headers]
+
+        except FileNotFoundError:
+            # File doesn't exist, start from scratch
+            return []
+
+        except EOFError:
+            # File doesn't contain what we're looking for, start from scratch
+            return []
+
+    def __parse_headers(self):
+        """
+        Parses just the header block of the pickle file. Files in the older
+        format have to be read whole, in which case every item comes back
+        already loaded.
+
+        Returns:
+            tuple: the list of headers, and a dictionary of loaded items by
+                   position
+        """
+        try:
+            with open(self.filename, 'rb') as infile:
+                headers = self.__read_header_block(infile)
+
+                if isinstance(headers, dict):
+                    data = headers['data']
+                    return [None] * len(data), dict(enumerate(data))
+
+                return headers, {}
+
+        except (FileNotFoundError, EOFError):
+            return [], {}
+
+    def __read_header_block(self, infile):
+        """
+        Reads the header block from the start of the file and notes where the
+        records are
+
+        Returns:
+            list: the header of each record, or for a file in the older
+                  format the whole of its contents as a dictionary
+        """
+        file_contents = pickle.load(infile)
+
+        if 'data' in file_contents:
+            return file_contents
+
+        self.file_compression = file_contents.get('compression')
+        headers = file_contents['headers']
+
+        if self.file_compression is not None:
+            decompress = COMPRESSORS[self.file_compression][1]
+            headers = pickle.loads(decompress(headers))
+
+        if self.table == 'tasks' and headers and isinstance(
+                headers[0].unique_id, str):
+            # Written before unique IDs were stored as integers
+            headers = [header._replace(
+                unique_id=normalise_unique_id(header.unique_id))
+                for header in headers]
+
+        self.__remember_layout(infile.tell(), headers, file_contents['size'])
+
+        return list(headers)
+
+    def __remember_layout(self, records_start, headers, size):
+        """
+        Notes where the records in a file of the current format are
+        """
+        self.records_start = records_start
+        offsets = [header.offset for header in headers]
+        self.record_ends = dict(zip(offsets, offsets[1:] + [size]))
+
+    def __read_record(self, infile, header, decompress=True):
+        """
+        Returns the pickled bytes of the record for a header, decompressed
+        unless asked otherwise
+        """
+        infile.seek(self.records_start + header.offset)
+        record = infile.read(self.record_ends[header.offset] - header.offset)
+
+        if decompress:
+            record = COMPRESSORS[self.file_compression][1](record)
+
+        return record
+
+    def replay_journal(self, data):
+        """
+        Applies every record in the journal to data, in the order they were
+        written. Replaying is idempotent, as each record holds the whole of
+        the item it changed.
+
+        Args:
+            data (list): the data parsed from the file, modified in place
+
+        Returns:
+            None.
+        """
+        for position, item in self.journal_records():
+            if position < len(data):
+                data[position] = item
+            else:
+                data.append(item)
+
+    def journal_records(self):
+        """
+        Yields each (position, item) record in the journal, in the order they
+        were written
+
+        Args:
+            None.
+
+        Returns:
+            generator: the journal records
+        """
+        try:
+            with open(self.journal_filename, 'rb') as infile:
+                while True:
+                    try:
+                        yield pickle.load(infile)
+                    except EOFError:
+                        break
+                    except (pickle.UnpicklingError, ValueError, TypeError):
+                        # A record cut short by a crash, nothing after it
+                        # can have been written
+                        break
+
+        except FileNotFoundError:
+            # Nothing has changed since the file was last written
+            return None
+
+    def save(self, data):
+        """
+        Atomically replaces the pickle file with all of data, then discards
+        the journal. Any items of a LazyItemList from this file that were
+        never loaded are copied across without being unpickled.
+
+        Args:
+            data (list): all the data to write to file
+
+        Returns:
+            SnapshotReport: the size of the new file and the time it took
+        """
+        start_time = time.perf_counter()
+        compress = COMPRESSORS[self.compression][0]
+        lazy = (isinstance(data, LazyItemList) and data.backend is self
+                and os.path.exists(self.filename))
+        copy_raw = lazy and self.file_compression == self.compression
+        records = []
+        headers = []
+        size = 0
+
+        with open(self.filename, 'rb') if lazy else nullcontext() as infile:
+            for position in range(len(data)):
+                if lazy and not data.is_loaded(position):
+                    header = data.headers[position]
+                    record = self.__read_record(infile, header,
+                                                decompress=not copy_raw)
+
+                    if not copy_raw:
+                        record = compress(record)
+                else:
+                    item = data[position]
+                    header = self.__make_header(item)
+                    record = compress(pickle.dumps(item,
+                                                   protocol=self.protocol))
+
+                headers.append(header._replace(offset=size))
+                records.append(record)
+                size += len(record)
+
+        file_contents = {
+            'format': self.FORMAT,
+            'compression': self.compression,
+            'headers': headers,
+            'size': size,
+            }
+
+        if self.compression is not None:
+            file_contents['headers'] = compress(
+                pickle.dumps(headers, protocol=self.protocol))
+
+        temporary_filename = self.filename + '.tmp'
+
+        with open(temporary_filename, 'wb') as outfile:
+            pickle.dump(file_contents, outfile, protocol=self.protocol)
+            records_start = outfile.tell()
+
+            for record in records:
+                outfile.write(record)
+
+            outfile.flush()
+            os.fsync(outfile.fileno())
+            file_size = outfile.tell()
+
+        os.replace(temporary_filename, self.filename)
+        _sync_directory(self.filename)
+
+        self.file_compression = self.compression
+        self.__remember_layout(records_start, headers, size)
+
+        if isinstance(data, LazyItemList) and data.backend is self:
+            data.headers = headers
+
+        if self.journal:
+            self.clear_journal()
+
+        return SnapshotReport(self.filename, file_size,
+                              time.perf_counter() - start_time)
+
+    def __make_header(self, item):
+        """
+        Returns the header for an item, which only records anything beyond
+        its offset for tasks
+        """
+        if self.table == 'tasks':
+            return task_header(item)
+
+        return ItemHeader(None, None, None, None, None)
+
+    def save_item(self, position, item):
+        """
+        Records that item now occupies position in the data, by appending it
+        to the journal and flushing it to disk. Does nothing unless in
+        journal mode.
+
+        Args:
+            position (int): the index of the item in the data list
+
+            item: the new or changed item
+
+        Returns:
+            None.
+        """
+        if not self.journal:
+            return None
+
+        self.save_items([(position, item)])
+
+    def save_items(self, items):
+        """
+        Appends a record for each item to the journal, flushing them to disk
+        together. Does nothing unless in journal mode.
+
+        Args:
+            items (list): (position, item) pairs, each new or changed item
+                          and the index it occupies in the data list
+
+        Returns:
+            None.
+        """
+        if not self.journal or not items:
+            return None
+
+        with open(self.journal_filename, 'ab') as outfile:
+            for position, item in items:
+                pickle.dump((position, item), outfile, protocol=self.protocol)
+
+            outfile.flush()
+            os.fsync(outfile.fileno())
+
+    def clear_journal(self):
+        """
+        Discards the journal, once its changes are all in the file
+        """
+        try:
+            os.remove(self.journal_filename)
+        except FileNotFoundError:
+            pass
+
+    def files(self):
+        return [self.filename, self.journal_filename]
+
+
+def _sync_directory(filename):
+    """
+    Makes a rename within the directory holding filename durable, on systems
+    that allow directories to be synced
+    """
+    if not hasattr(os, 'O_DIRECTORY'):
+        return None
+
+    directory = os.open(os.path.dirname(os.path.abspath(filename)),
+                        os.O_RDONLY | os.O_DIRECTORY)
+
+    try:
+        os.fsync(directory)
+    finally:
+        os.close(directory)
+
+
+class SQLiteBackend(StorageBackend):
+    """
+    Stores the data in a table of a SQLite database, one row per item. Each
+    row holds the pickled item along with indexed columns describing it, and
+    for tasks the subtask links are kept in a table of their own. Every
+    change is written in its own transaction.
+
+    Args:
+        database (str): the SQLite database file to use
+
+        table (str): the table holding the data, 'tasks', 'projects' or
+                     'filters'
+
+        protocol (int): the pickle protocol to write items with, defaults to
+                        pickle.DEFAULT_PROTOCOL
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS tasks (
+            position INTEGER PRIMARY KEY,
+            unique_id TEXT NOT NULL,
+            state TEXT NOT NULL,
+            priority INTEGER NOT NULL,
+            blocked INTEGER NOT NULL,
+            data BLOB NOT NULL);
+        CREATE INDEX IF NOT EXISTS tasks_unique_id ON tasks (unique_id);
+        CREATE INDEX IF NOT EXISTS tasks_state ON tasks (state, blocked,
+                                                         priority);
+        CREATE TABLE IF NOT EXISTS subtasks (
+            parent_id TEXT NOT NULL,
+            child_id TEXT NOT NULL,
+            PRIMARY KEY (parent_id, child_id));
+        CREATE INDEX IF NOT EXISTS subtasks_child_id ON subtasks (child_id);
+        CREATE TABLE IF NOT EXISTS projects (
+            position INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            data BLOB NOT NULL);
+        CREATE INDEX IF NOT EXISTS projects_description ON projects
+            (description);
+        CREATE TABLE IF NOT EXISTS filters (
+            position INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            data BLOB NOT NULL);
+        """
+
+    # The indexed columns of each table, alongside position and data
+    COLUMNS = {
+        'tasks': ('unique_id', 'state', 'priority', 'blocked'),
+        'projects': ('description',),
+        'filters': ('name',),
+        }
+
+    def __init__(self, database, table, protocol=pickle.DEFAULT_PROTOCOL):
+        self.database = database
+        self.table = table
+        self.protocol = protocol
+
+        # Imported here so that pickle storage doesn't pay for loading it
+        import sqlite3
+
+        # Access is serialised by the callers, so the connection may be shared
+        # with background threads
+        self.connection = sqlite3.connect(database, check_same_thread=False)
+        self.connection.executescript(self.SCHEMA)
+
+        columns = ('position',) + self.COLUMNS[table] + ('data',)
+        self.insert_sql = 'INSERT OR REPLACE INTO {} ({}) VALUES ({})'.format(
+            table, ', '.join(columns), ', '.join('?' * len(columns)))
+
+    def load(self):
+        """
+        Returns every item in the table, in position order
+        """
+        cursor = self.connection.execute(
+            'SELECT data FROM {} ORDER BY position'.format(self.table))
+        return [pickle.loads(data) for data, in cursor]
+
+    def load_item(self, position):
+        """
+        Returns the item stored at position, fetching only its row
+        """
+        row = self.connection.execute(
+            'SELECT data FROM {} WHERE position = ?'.format(self.table),
+            (position,)).fetchone()
+
+        if row is None:
+            raise IndexError("No item at position {}".format(position))
+
+        return pickle.loads(row[0])
+
+    def count(self):
+        return self.connection.execute(
+            'SELECT COUNT(*) FROM {}'.format(self.table)).fetchone()[0]
+
+    def load_lazy(self):
+        """
+        Reads just the indexed columns of each task row, and the subtask
+        links, and returns a LazyItemList over the tasks, with each header's
+        offset being the row's position
+
+        Args:
+            None.
+
+        Returns:
+            LazyItemList: the tasks in the table, loaded on demand
+        """
+        if self.table != 'tasks':
+            data = self.load()
+            return LazyItemList(self, [None] * len(data), dict(enumerate(data)))
+
+        # Each task's subtask links are written in order, so reading them in
+        # rowid order gives each task's subtasks in order
+        subtask_ids = {}
+        cursor = self.connection.execute(
+            'SELECT parent_id, child_id FROM subtasks ORDER BY rowid')
+
+        for parent_id, child_id in cursor:
+            subtask_ids.setdefault(parent_id, []).append(
+                normalise_unique_id(child_id))
+
+        cursor = self.connection.execute(
+            'SELECT unique_id, state, priority, blocked, position FROM tasks '
+            'ORDER BY position')
+        headers = [ItemHeader(normalise_unique_id(unique_id), state, priority,
+                              bool(blocked), position,
+                              tuple(subtask_ids.get(unique_id, ())))
+                   for unique_id, state, priority, blocked, position in cursor]
+
+        return LazyItemList(self, headers)
+
+    def load_from_header(self, header):
+        return self.load_item(header.offset)
+
+    def save(self, data):
+        """
+        Replaces the contents of the table with data in a single transaction.
+        For a LazyItemList from this table only the loaded items are written,
+        as the rest are unchanged.
+
+        Args:
+            data (list): all the items to store
+
+        Returns:
+            SnapshotReport: the size of the database and the time it took
+        """
+        start_time = time.perf_counter()
+
+        if isinstance(data, LazyItemList) and data.backend is self:
+            with self.connection:
+                self.connection.execute(
+                    'DELETE FROM {} WHERE position >= ?'.format(self.table),
+                    (len(data),))
+
+                for position in range(len(data)):
+                    if data.is_loaded(position):
+                        self.__write_row(position, data[position])
+        else:
+            with self.connection:
+                self.connection.execute('DELETE FROM {}'.format(self.table))
+
+                if self.table == 'tasks':
+                    self.connection.execute('DELETE FROM subtasks')
+
+                for position, item in enumerate(data):
+                    self.__write_row(position, item)
+
+        return self.__report(start_time)
+
+    def compact(self, data):
+        """
+        Saves data, then rebuilds the database file to reclaim unused space
+
+        Args:
+            data (list): all the items to store
+
+        Returns:
+            SnapshotReport: the size of the database and the time it took
+        """
+        start_time = time.perf_counter()
+        self.save(data)
+        self.connection.execute('VACUUM')
+
+        return self.__report(start_time)
+
+    def __report(self, start_time):
+        """
+        Returns a SnapshotReport for a write that began at start_time
+        """
+        return SnapshotReport(self.database, os.path.getsize(self.database),
+                              time.perf_counter() - start_time)
+
+    def save_item(self, position, item):
+        """
+        Inserts or replaces the row for a single item in its own transaction
+
+        Args:
+            position (int): the index of the item in the data list
+
+            item: the new or changed item
+
+        Returns:
+            None.
+        """
+        with self.connection:
+            self.__write_row(position, item)
+
+    def save_items(self, items):
+        """
+        Inserts or replaces the rows for several items in a single
+        transaction
+
+        Args:
+            items (list): (position, item) pairs, each new or changed item
+                          and the index it occupies in the data list
+
+        Returns:
+            None.
+        """
+        with self.connection:
+            for position, item in items:
+                self.__write_row(position, item)
+
+    def files(self):
+        return [self.database]
+
+    def __write_row(self, position, item):
+        """
+        Writes the row for an item, and for tasks its subtask links
+        """
+        if self.table == 'tasks':
+            unique_id = str(item.unique_id)
+            values = (unique_id, item.state, int(item.priority),
+                      item.is_blocked)
+
+            self.connection.execute(
+                'DELETE FROM subtasks WHERE parent_id = ?', (unique_id,))
+            self.connection.executemany(
+                'INSERT OR IGNORE INTO subtasks VALUES (?, ?)',
+                [(unique_id, str(child_id)) for child_id in item.subtask_ids])
+        else:
+            values = tuple(getattr(item, column)
+                           for column in self.COLUMNS[self.table])
+
+        self.connection.execute(
+            self.insert_sql,
+            (position,) + values + (pickle.dumps(item,
+                                                 protocol=self.protocol),))
+
+
+def file_signature(filenames):
+    """
+    Returns the size and modification time of each file, which only stay the
+    same while the files are left alone
+
+    Args:
+        filenames (list): the files
+
+    Returns:
+        tuple: a (filename, size, modification time) tuple for each file,
+               with None for the size and time of any that don't exist
+    """
+    signature = []
+
+    for filename in filenames:
+        try:
+            stat = os.stat(filename)
+            signature.append((filename, stat.st_size, stat.st_mtime_ns))
+        except FileNotFoundError:
+            signature.append((filename, None, None))
+
+    return tuple(signature)
+
+
+def create_backend(filename, table):
+    """
+    Creates the storage backend chosen in the config
+
+    Args:
+        filename (str): the pickle file holding the data
+
+        table (str): the SQLite table holding the data
+
+    Returns:
+        StorageBackend: the backend to use for the data
+    """
+    if config.storage == 'sqlite' and table is not None:
+        return SQLiteBackend(config.database_file, table,
+                             protocol=config.pickle_protocol)
+
+    return PickleBackend(filename, journal=config.journal, table=table,
+                         protocol=config.pickle_protocol,
+                         compression=config.compression)
+
+
+def migrate_pickles_to_sqlite(database=None):
+    """
+    Imports the tasks, projects and saved filters from the pickle files named
+    in the config, including anything still in their journals, into a SQLite
+    database, replacing whatever the database held before
+
+    Args:
+        database (str): the SQLite database file, defaults to the one in the
+                        config
+
+    Returns:
+        dict: the number of items imported into each table
+    """
+    if database is None:
+        database = config.database_file
+
+    imported = {}
+
+    for filename, table in [(config.task_file, 'tasks'),
+                            (config.project_file, 'projects'),
+                            (config.filter_file, 'filters')]:
+        data = PickleBackend(filename, journal=True).load()
+        SQLiteBackend(database, table).save(data)
+        imported[table] = len(data)
+
+    return imported
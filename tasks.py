@@ -1,15 +1,120 @@
+import re
+import sys
 from config import config
 from datetime import datetime
+from functools import partial
 from prettytable import PrettyTable
 from filehandler import FileHandler
-from base import BaseCommandHandler
-from utilities import generate_unique_id
+from listing import parse_page, print_page
+from storage import LazyItemList
+from base import BaseCommandHandler, CommandError
+from query import QueryError, compile_query
+from utilities import generate_unique_id, normalise_unique_id
 
+# The most levels of subtasks that can be below any task
 MAX_DEPTH = 30
 
 TASK_FIELDS = ['Description', 'Priority', 'Created', 'Due', 'Blocked Behind',
                'Time estimate', 'Time Spent', 'Projects', 'Contexts']
 
+# Tasks store their state as an index into this tuple
+TASK_STATES = ('open', 'closed')
+
+# The commands that change the current task, which can instead be applied to
+# a range or list of tasks, or to every task matching a query
+BULK_COMMANDS = ('bu', 'c', 'co', 'cr', 'dd', 'p', 'pr', 'te', 'ts')
+
+# The commands that can be followed by 'where' and a query, as in 'c where
+# project:Foo' or 'p 1 where context:office', by the number of words of
+# arguments before 'where'. Commands taking free text aren't included, as
+# 'where' could be part of the text.
+WHERE_COMMANDS = {'c': 0, 'p': 1}
+
+# An index or a range of indices, in a selection such as '3,10-50'
+SELECTION_PART = re.compile(r'(\d+)(?:-(\d+))?$')
+
+def parse_selection(selection, task_count):
+    """
+    Reads a selection of task indices, such as '10-50' or '2,5,9-12'
+    
+    Args:
+        selection (str): indices and inclusive ranges of indices, separated
+                         by commas
+                         
+        task_count (int): how many tasks there are
+        
+    Returns:
+        list: the indices selected, each once and in order
+        
+    Raises:
+        ValueError: if the selection can't be understood, or names a task
+                    that doesn't exist
+    """
+    indices = set()
+    
+    for part in selection.split(','):
+        match = SELECTION_PART.match(part)
+        
+        if match is None:
+            raise ValueError("Can't understand the tasks " + selection)
+            
+        first = int(match.group(1))
+        last = int(match.group(2) or first)
+        
+        if first > last:
+            raise ValueError("Can't understand the tasks " + selection)
+        
+        if last >= task_count:
+            raise ValueError("There's no task with index {}".format(last))
+            
+        indices.update(range(first, last + 1))
+        
+    return sorted(indices)
+
+def split_bracketed(text):
+    """
+    Splits a query in brackets from the start of text, such as the
+    '(project:Foo)' of '(project:Foo) p 1'
+    
+    Args:
+        text (str): the text, starting with an opening bracket
+        
+    Returns:
+        tuple: the query, with its outer brackets, and the text after it
+        
+    Raises:
+        ValueError: if the brackets aren't closed
+    """
+    depth = 0
+    quoted = False
+    
+    for position, character in enumerate(text):
+        if character == '"':
+            quoted = not quoted
+        elif quoted:
+            continue
+        elif character == '(':
+            depth += 1
+        elif character == ')':
+            depth -= 1
+            
+            if not depth:
+                return text[:position + 1], text[position + 1:].lstrip()
+                
+    raise ValueError("The query's brackets aren't closed")
+
+class SubtaskError(Exception):
+    """
+    Raised when making one task a subtask of another would create a cycle or
+    a tree deeper than MAX_DEPTH
+    """
+
+class BlockerError(Exception):
+    """
+    Raised when blocking one task behind another would create a cycle, or
+    the task to block it behind is already closed
+    """
+
 class TaskCommandHandler(BaseCommandHandler):
     """
     Handles commands related to tasks, primarily by invoking the Task Manager
@@ -24,7 +129,7 @@ class TaskCommandHandler(BaseCommandHandler):
         self.task_manager = TaskManager()
         self.switcher = {
             'a':  self.add_new,
-            'bu': self.add_to_contexts_current_task,
+            'bu': self.add_to_blocked_until_current_task,
             'c':  self.set_closed_current_task,
             'co': self.add_to_contexts_current_task,
             'cr': self.set_created_current_task,
@@ -39,6 +144,14 @@ class TaskCommandHandler(BaseCommandHandler):
             'ms': self.make_subtask_of_current_task,
             'sc': self.set_current_task,
             }
+            
+        # Applied to several tasks by 'sc', without looking for a query
+        self.bulk_switcher = {command: self.switcher[command]
+                              for command in BULK_COMMANDS}
+                              
+        for command, argument_words in WHERE_COMMANDS.items():
+            self.switcher[command] = partial(self.apply_where, argument_words,
+                                             self.bulk_switcher[command])
                              
     def get_task_manager(self):
         """
@@ -51,6 +164,9 @@ class TaskCommandHandler(BaseCommandHandler):
             TaskManager(), or None.
         """
         return self.task_manager
+        
+    def get_managers(self):
+        return [self.task_manager]
     
     def close(self):
         """
@@ -70,11 +186,22 @@ class TaskCommandHandler(BaseCommandHandler):
     
     def add_to_blocked_until_current_task(self, new_blocked_until):
         """
-        Adds to the blocked until list on the current task
+        Adds to the blocked until list on the current task. A number blocks
+        it behind the task with that index, until that task is closed, and
+        anything else is kept as it's given.
         """
-        self.task_manager.modify_attribute_current_task('blocked_until',
-                                                        new_blocked_until)
-        return None
+        if not new_blocked_until.strip().isdigit():
+            self.task_manager.modify_attribute_current_task('blocked_until',
+                                                            new_blocked_until)
+            return None
+            
+        try:
+            self.task_manager.add_blocker_to_current_task(new_blocked_until)
+        except BlockerError as err:
+            if self.raise_errors:
+                raise CommandError(str(err))
+                
+            print(err)
 
     def set_closed_current_task(self, remaining_command):
         """
@@ -87,7 +214,7 @@ class TaskCommandHandler(BaseCommandHandler):
         """
         Sets the created date/time on the current task
         """
-        self.task_manager.modify_attribute_current_task('create', new_created)       
+        self.task_manager.modify_attribute_current_task('created', new_created)       
         return None
 
     def add_to_contexts_current_task(self, new_context):
@@ -99,241 +226,1299 @@ class TaskCommandHandler(BaseCommandHandler):
     
     def display_current_task(self, remaining_command):
         """
-        Displays the current task
+        Displays the current task
+        """
+        self.task_manager.display_current_task()
+        return remaining_command
+        
+    def display_all(self, remaining_command):
+        """
+        Displays all tasks in the task manager, or a page of them when
+        followed by --limit or --offset and a number of tasks
+        """
+        page, remaining_command = parse_page(remaining_command)
+        self.task_manager.display_all_tasks(page)
+        return remaining_command
+
+    def set_due_date_current_task(self, new_due_date):
+        """
+        Sets the due date/time on the current task
+        """
+        self.task_manager.modify_attribute_current_task('due', new_due_date)
+
+    def edit_current_task(self, remaining_command):
+        """
+        Edit the current command
+        """
+        self.task_manager.edit_current_task()
+        return remaining_command
+
+    def set_priority_current_task(self, new_priority):
+        """
+        Sets the priority on the current task
+        """
+        self.task_manager.modify_attribute_current_task('priority', 
+                                                        new_priority)
+
+    def add_to_projects_current_task(self, new_project):
+        """
+        Adds to the projects list on the current task
+        """
+        self.task_manager.modify_attribute_current_task('projects',
+                                                        new_project)
+                      
+    def set_time_estimate_current_task(self, time_estimate):
+        """
+        Sets the time estimate on the current task
+        """
+        self.task_manager.modify_attribute_current_task('time_estimate',
+                                                        time_estimate)
+
+    def set_time_spent_current_task(self, time_spent):
+        """
+        Sets the time spent on the current task
+        """
+        self.task_manager.modify_attribute_current_task('time_spent', 
+                                                        time_spent)    
+
+    def make_subtask_of_current_task(self, subtask_index):
+        """
+        Adds the task with specified index as a subtask of the current 
+        task
+        """
+        try:
+            self.task_manager.add_subtask_to_current_task(subtask_index)
+        except SubtaskError as err:
+            if self.raise_errors:
+                raise CommandError(str(err))
+                
+            print(err)
+        
+    def set_current_task(self, remaining_command):
+        """
+        Sets the current task to the index specified. Given a range or list
+        of indices, or a query in brackets, followed by a command that
+        changes a task, such as 'sc 10-50 p 1', 'sc 2,5,9 c' or
+        'sc (project:Foo) co office', runs the command on each of those
+        tasks as a single batch instead, leaving the current task as it was.
+        """
+        remaining_command = remaining_command.lstrip()
+        
+        if remaining_command.startswith('('):
+            try:
+                query, remaining_command = split_bracketed(remaining_command)
+                indices = compile_query(query).run(self.task_manager)
+            except (ValueError, QueryError) as err:
+                self.report_error(err)
+                return None
+                
+            words = ['', remaining_command]
+        else:
+            words = remaining_command.split(maxsplit=1)
+            selection = words[0] if words else ''
+            
+            if selection.isdigit():
+                self.task_manager.set_current_task(selection)
+                
+                # The rest of the line, which the command parser recognises
+                # without splitting it into words again
+                return words[1] if len(words) > 1 else None
+                
+            try:
+                indices = parse_selection(selection,
+                                          len(self.task_manager.task_list))
+            except ValueError as err:
+                self.report_error(err)
+                return None
+                
+        words = words[1].split(maxsplit=1) if len(words) > 1 else []
+        command = words[0] if words else ''
+        
+        if command not in self.bulk_switcher:
+            self.report_error("Only these commands can be run on several "
+                              "tasks: " + ', '.join(BULK_COMMANDS))
+            return None
+            
+        self.apply_to_tasks(self.bulk_switcher[command],
+                            words[1] if len(words) > 1 else '', indices)
+            
+    def apply_where(self, argument_words, command, remaining_command):
+        """
+        Runs a command that changes the current task. When its arguments are
+        followed by 'where' and a query, such as 'c where project:Foo', runs
+        it on each task matching the query as a single batch instead.
+        
+        Args:
+            argument_words (int): how many words of arguments the command
+                                  takes, which come before 'where'
+                                  
+            command: the handler method for the command
+            
+            remaining_command (str): the rest of the command line
+            
+        Returns:
+            str: whatever the command leaves of the command line
+        """
+        words = remaining_command.split(maxsplit=argument_words + 1)
+        
+        if len(words) < argument_words + 2 or words[argument_words] != 'where':
+            return command(remaining_command)
+            
+        try:
+            indices = compile_query(words[-1]).run(self.task_manager)
+        except QueryError as err:
+            self.report_error(err)
+            return None
+            
+        self.apply_to_tasks(command, ' '.join(words[:argument_words]),
+                            indices)
+        
+    def apply_to_tasks(self, command, arguments, indices):
+        """
+        Runs a command that changes the current task on each of the tasks
+        with the specified indices, as a single batch
+        """
+        changed = self.task_manager.apply_to_tasks(
+            indices, lambda: command(arguments))
+        print("Changed {} task{}".format(changed, '' if changed == 1 else 's'))
+        
+    def report_error(self, err):
+        """
+        Reports a command that failed, raising a CommandError instead when
+        asked to
+        """
+        if self.raise_errors:
+            raise CommandError(str(err))
+            
+        print(err)
+
+
+class TaskManager():
+    """
+    A class that handles a list of tasks in aggregate
+    
+    Args:
+        filehandler (FileHandler): where the tasks are stored, defaults to
+                                   the task file in the config
+    """
+    def __init__(self, filehandler=None):
+        if filehandler is None:
+            filehandler = FileHandler(config.task_file, table='tasks')
+            
+        self.filehandler = filehandler
+        
+        if config.lazy_load:
+            self.task_list = self.filehandler.parse_file_lazily()
+        else:
+            self.task_list = self.filehandler.parse_file()
+            
+        self.current_task_index = 0
+        self.task_index = TaskIndex()
+        self.subtask_tree = SubtaskTree()
+        self.blocker_graph = BlockerGraph()
+        
+        # Whether anything has changed since the task list was last written
+        self.dirty = False
+
+        # Kept up to date with changes to the task list, through their
+        # task_added, task_changed and tasks_reindexed methods
+        self.listeners = []
+
+        # The changed tasks waiting to be written together, by index, while
+        # a batch of changes is being applied
+        self.pending_writes = None
+
+        self.reindex_tasks()
+
+    def reindex_tasks(self):
+        """
+        Rebuilds the unique ID to index map from the task list. Anything that
+        removes or reorders tasks in the task list must call this afterwards.
+        A lazily loaded task list is indexed from its headers where possible,
+        without loading the tasks.
+
+        Args:
+            None.
+
+        Returns:
+            None.
+        """
+        self.task_index.rebuild(self.task_list)
+        self.subtask_tree.rebuild(self.task_list)
+        self.blocker_graph.rebuild(self.task_list)
+
+        if isinstance(self.task_list, LazyItemList):
+            self.unique_id_index = {}
+            
+            for index, header in enumerate(self.task_list.headers):
+                if self.task_list.is_loaded(index):
+                    unique_id = self.task_list[index].unique_id
+                else:
+                    unique_id = header.unique_id
+
+                self.unique_id_index[unique_id] = index
+            
+            self.task_list.on_load = self.take_on_task
+            tasks = self.task_list.loaded_items()
+        else:
+            self.unique_id_index = {
+                task.unique_id: index
+                for index, task in enumerate(self.task_list)}
+            tasks = self.task_list
+
+        for task in tasks:
+            self.take_on_task(task)
+
+        for listener in self.listeners:
+            listener.tasks_reindexed()
+
+    def add_listener(self, listener):
+        """
+        Adds something to keep up to date with changes to the task list, such
+        as a saved filter's view
+        """
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        """
+        Stops keeping something up to date with changes to the task list
+        """
+        self.listeners.remove(listener)
+
+    def take_on_task(self, task):
+        """
+        Makes this task manager the listener for changes to a task in its
+        task list
+        """
+        task.listener = self
+
+    def task_changed(self, task, attribute):
+        """
+        Called by a task whenever one of its attributes is modified, so that
+        the indexes over the task list can be kept up to date and the change
+        journalled. Closing a task unblocks the tasks blocked behind it.
+
+        Args:
+            task (Task): the task that changed
+
+            attribute (str): the name of the attribute that changed
+
+        Returns:
+            None.
+        """
+        task_index = self.unique_id_index[task.unique_id]
+        self.task_index.update_task(task, attribute)
+        self.subtask_tree.update_task(task, attribute)
+        self.blocker_graph.update_task(task, attribute)
+
+        for listener in self.listeners:
+            listener.task_changed(task, attribute)
+
+        if self.pending_writes is not None:
+            self.pending_writes[task_index] = task
+        else:
+            self.filehandler.write_item(task_index, task)
+
+        self.dirty = True
+
+        if attribute == 'state' and task.state == 'closed':
+            self.unblock_dependents(task)
+
+    def unblock_dependents(self, task):
+        """
+        Removes a closed task from the blocked until list of each task
+        blocked behind it, which costs time in proportion to the number of
+        those tasks rather than the size of the task list
+        """
+        # Copied, as each removal changes the graph
+        for dependent_id in list(self.blocker_graph.dependents_of(
+                task.unique_id)):
+            dependent = self.return_task_with_unique_id(dependent_id)
+
+            if dependent is not None:
+                dependent.remove_blocked_until(task.unique_id)
+
+    def add_task(self, description):
+        """
+        Adds a task to the manager using the description
+        """
+        new_task = Task(description=description)
+        self.unique_id_index[new_task.unique_id] = len(self.task_list)
+        self.task_list.append(new_task)
+        self.task_index.add_task(new_task)
+        self.subtask_tree.add_task(new_task)
+        self.blocker_graph.add_task(new_task)
+
+        for listener in self.listeners:
+            listener.task_added(new_task)
+
+        self.take_on_task(new_task)
+        self.filehandler.write_item(len(self.task_list) - 1, new_task)
+        self.dirty = True
+        self.current_task_index = len(self.task_list) - 1    
+        self.display_current_task()
+       
+    def display_task_by_index(self, task_index):
+        """
+        Displays a given task, along with all subtasks
+        """
+        self.display_list_of_tasks_by_index([task_index])
+
+    def __generate_rows_for_task(self, task_index):
+        """
+        Generates the table row for the task with the specified index,
+        followed by the rows for all of its subtasks
+        """
+        task = self.return_task_with_index(task_index)
+        yield [task_index] + task.attributes_as_list()
+
+        # The index path of each task shown, so that each row can be labelled
+        # with the path from the top task down to it
+        index_paths = {task.unique_id: str(task_index)}
+
+        for parent_id, unique_id in self.subtask_tree.walk(
+                task.unique_id, self.__is_hidden_subtask):
+            subtask_index = self.unique_id_index[unique_id]
+            index_path = index_paths[parent_id] + "-" + str(subtask_index)
+            index_paths[unique_id] = index_path
+
+            yield ([index_path]
+                   + self.task_list[subtask_index].attributes_as_list())
+
+    def __is_hidden_subtask(self, unique_id):
+        """
+        Whether a subtask is left out of displays, along with all of its own
+        subtasks, because it's closed or no longer exists
+        """
+        task = self.return_task_with_unique_id(unique_id)
+        return task is None or task.state == 'closed'
+        
+    def return_index_for_unique_id(self, unique_id):    
+        """
+        Finds the current index of the task with the specified unique ID, or
+        None if there is no such task
+        """
+        return self.unique_id_index.get(unique_id)
+
+    def return_task_with_unique_id(self, unique_id):
+        """
+        Returns the task with the specified unique ID, or None if there is no
+        such task
+        """
+        task_index = self.unique_id_index.get(unique_id)
+
+        if task_index is None:
+            return None
+
+        return self.task_list[task_index]
+       
+    def display_current_task(self):
+        """
+        Displays the current task
+        """
+        self.display_task_by_index(self.current_task_index)
+        
+    def display_all_tasks(self, page=None):
+        """
+        Outputs a table showing all available tasks, sorted by index
+        
+        Args:
+            page (Page): which rows to stream, defaults to None for a single
+                         table of them all
+            
+        Returns:
+            None.
+        """
+        self.display_list_of_tasks_by_index(
+            self.filter(only_active=False, state='open'), page)
+
+    def display_list_of_tasks_by_index(self, index_list, page=None,
+                                       in_order=False):
+        """
+        Displays the tasks with the indices specified, each followed by its
+        subtasks, sorted by index. The rows are either built into a single
+        table or streamed a page at a time.
+        
+        Args:
+            index_list (iterable): the task indices to display, duplicates
+                                   are only shown once
+                                   
+            page (Page): which rows to stream, defaults to None for a single
+                         table of them all
+                         
+            in_order (bool): whether to keep the tasks in the order given,
+                             such as for ranked search results, rather than
+                             sorting them by index, defaults to False
+            
+        Returns:
+            None.
+        """
+        if in_order:
+            index_list = list(dict.fromkeys(int(index)
+                                            for index in index_list))
+        else:
+            index_list = sorted({int(index) for index in index_list})
+
+        rows = (row for index in index_list
+                for row in self.__generate_rows_for_task(index))
+
+        if page is not None:
+            print_page(['Index'] + TASK_FIELDS, rows, page)
+            return None
+
+        table = PrettyTable(['Index'] + TASK_FIELDS)
+        table.align['Index'] = "l"
+
+        for row in rows:
+            table.add_row(row)
+
+        if table.rowcount:
+            print(table)
+
+    def modify_attribute_current_task(self, attribute, value):
+        """
+        Sets the attribute on the currently active task to value.
+        
+        Args:
+            attribute (str): a string specifying the attribute 
+                             to modify
+                             
+            value: the new value
+        
+        Returns:
+            None.
+        """
+        setattr(self.task_list[self.current_task_index],
+                attribute,
+                value)    
+        
+    def add_subtask_to_current_task(self, subtask_index):
+        """
+        Makes the task with the specified index a subtask of the current task
+        """
+        task = self.task_list[self.current_task_index]
+        subtask = self.return_task_with_index(subtask_index)
+        self.subtask_tree.check_subtask(task.unique_id, subtask.unique_id)
+        self.modify_attribute_current_task('subtasks', subtask.unique_id)
+
+    def apply_to_tasks(self, indices, change):
+        """
+        Applies a change to each of the tasks with the specified indices as
+        a single batch. Each task is made the current task in turn while
+        change is called, and the indexes are kept up to date as usual, but
+        the tasks changed are only written to file once, together, at the
+        end.
+        
+        Args:
+            indices (list): the indices of the tasks to change
+            
+            change (function): called with no arguments to change the current
+                               task
+                               
+        Returns:
+            int: how many tasks were changed, including any changed as a
+                 result, such as those unblocked by closing a task
+        """
+        current_task_index = self.current_task_index
+        self.pending_writes = {}
+
+        try:
+            for index in indices:
+                self.current_task_index = index
+                change()
+        finally:
+            self.current_task_index = current_task_index
+            pending_writes = self.pending_writes
+            self.pending_writes = None
+            self.filehandler.write_items(sorted(pending_writes.items()))
+
+        return len(pending_writes)
+
+    def add_blocker_to_current_task(self, blocker_index):
+        """
+        Blocks the current task behind the task with the specified index,
+        until that task is closed
+        """
+        task = self.task_list[self.current_task_index]
+        blocker_index = int(blocker_index)
+
+        if not 0 <= blocker_index < len(self.task_list):
+            raise BlockerError(
+                "There's no task with index {}".format(blocker_index))
+
+        blocker = self.return_task_with_index(blocker_index)
+
+        if blocker.state == 'closed':
+            raise BlockerError("That task is already closed")
+
+        self.blocker_graph.check_blocker(task.unique_id, blocker.unique_id)
+        self.modify_attribute_current_task('blocked_until', blocker.unique_id)
+
+    def return_ancestor_indices(self, index):
+        """
+        Returns the indices of every task the task with the specified index
+        is below, nearest first
+        """
+        task = self.return_task_with_index(index)
+
+        return [self.unique_id_index[unique_id]
+                for unique_id in self.subtask_tree.ancestors(task.unique_id)
+                if unique_id in self.unique_id_index]
+
+    def return_subtree_indices(self, index):
+        """
+        Returns the indices of every task below the task with the specified
+        index, in the order they're displayed
+        """
+        task = self.return_task_with_index(index)
+
+        return [self.unique_id_index[unique_id]
+                for unique_id in self.subtask_tree.subtree(task.unique_id)
+                if unique_id in self.unique_id_index]
+
+    def return_task_with_index(self, index):  
+        """
+        Returns the task with the specified index
+        """
+        return self.task_list[int(index)]  
+    
+    def set_current_task(self, index):
+        """
+        Sets the current task index
+        """
+        self.current_task_index = int(index)
+        
+    def filter(self, only_active=True, state=None, priority=None,
+               project=None, context=None):
+        """
+        Returns a filtered list of task indices, looked up through the task
+        index rather than by scanning the task list
+        
+        Args:
+            only_active (bool): only return those tasks which are open and
+                                aren't blocked
+
+            state (str): only return tasks in this state, defaults to None
+
+            priority (int): only return tasks with this priority, defaults
+                            to None
+
+            project (str): only return tasks in this project, defaults to
+                           None
+
+            context (str): only return tasks with this context, defaults to
+                           None
+            
+        Returns:
+            list: the indices of the matching tasks, in index order
+        """     
+        criteria = []
+
+        if only_active:
+            criteria.append(('active', True))
+
+        if state is not None:
+            criteria.append(('state', state))
+
+        if priority is not None:
+            criteria.append(('priority', int(priority)))
+
+        if project is not None:
+            criteria.append(('projects', project))
+
+        if context is not None:
+            criteria.append(('contexts', context))
+
+        if not criteria:
+            return list(range(len(self.task_list)))
+
+        # Intersect starting from the smallest set so the cost is bounded by
+        # the size of the result rather than the size of the task list
+        unique_id_sets = sorted((self.task_index.lookup(index_name, key)
+                                 for index_name, key in criteria), key=len)
+        matching_unique_ids = unique_id_sets[0].intersection(
+            *unique_id_sets[1:])
+
+        return sorted(self.unique_id_index[unique_id]
+                      for unique_id in matching_unique_ids)
+        
+    def return_indices_for_project(self, project):
+        """
+        Returns the indices of all tasks in the named project, in index order
+        """
+        return self.filter(only_active=False, project=project)
+
+    def compact(self):
+        """
+        Rewrites the task file in full, folding in any journalled changes
+        
+        Returns:
+            SnapshotReport: what was written and how long it took
+        """
+        report = self.filehandler.compact(self.task_list)
+        self.dirty = False
+        return report
+        
+    def autosave(self):
+        """
+        Writes the current state to file if anything has changed since it
+        was last written
+        
+        Returns:
+            bool: whether anything was written
+        """
+        if not self.dirty:
+            return False
+            
+        self.close()
+        return True
+
+    def close(self):
+        """
+        Closes the task manager by writing the current state to file
+        """
+        self.filehandler.write_to_file(self.task_list)
+        self.dirty = False
+
+
+class TaskIndex():
+    """
+    Secondary indexes over a task list. Each index maps an attribute value to
+    the set of unique IDs of the tasks that currently have that value, and is
+    kept up to date incrementally as tasks change.
+    
+    Args:
+        None.
+    """
+    # How to derive the keys each index files a task under
+    INDEX_KEYS = {
+        'state': lambda task: (task.state,),
+        'priority': lambda task: (task._priority,),
+        'projects': lambda task: tuple(task._projects),
+        'contexts': lambda task: tuple(task._contexts),
+        'blocked': lambda task: (task.is_blocked,),
+        'active': lambda task: (task.state != 'closed'
+                                and not task.is_blocked,),
+        }
+
+    # How to derive the keys for the indexes that can be built from a stored
+    # task's header, without loading the task
+    HEADER_INDEX_KEYS = {
+        'state': lambda header: (header.state,),
+        'priority': lambda header: (header.priority,),
+        'blocked': lambda header: (bool(header.blocked),),
+        'active': lambda header: (header.state != 'closed'
+                                  and not header.blocked,),
+        }
+
+    # Which indexes need updating when a given task attribute changes
+    INDEXES_FOR_ATTRIBUTE = {
+        'state': ('state', 'active'),
+        'priority': ('priority',),
+        'projects': ('projects',),
+        'contexts': ('contexts',),
+        'blocked_until': ('blocked', 'active'),
+        }
+
+    def __init__(self):
+        self.indexes = {index_name: {} for index_name in self.INDEX_KEYS}
+        self.entries = {}
+        self.deferred_task_list = None
+
+    def rebuild(self, task_list):
+        """
+        Discards all indexes and rebuilds them from the task list. Tasks in a
+        lazily loaded task list that aren't loaded yet are indexed from their
+        headers, and the indexes that need more than a header are only
+        completed the first time they are looked up.
+        
+        Args:
+            task_list (list): all the tasks to index
+            
+        Returns:
+            None.
+        """
+        self.indexes = {index_name: {} for index_name in self.INDEX_KEYS}
+        self.entries = {}
+        self.deferred_task_list = None
+
+        if not isinstance(task_list, LazyItemList):
+            for task in task_list:
+                self.add_task(task)
+                
+            return None
+
+        for position, header in enumerate(task_list.headers):
+            if task_list.is_loaded(position):
+                self.add_task(task_list[position])
+            else:
+                self.__add_header(header)
+
+        self.deferred_task_list = task_list
+
+    def __add_header(self, header):
+        """
+        Files a stored task under the indexes that can be built from its
+        header
+        """
+        self.entries[header.unique_id] = {}
+
+        for index_name, get_keys in self.HEADER_INDEX_KEYS.items():
+            self.__file(header.unique_id, index_name, get_keys(header))
+
+    def __complete_deferred_indexes(self):
+        """
+        Loads every task, to file them under the indexes that couldn't be
+        built from their headers
+        """
+        task_list = self.deferred_task_list
+        self.deferred_task_list = None
+
+        for task in task_list:
+            entry = self.entries[task.unique_id]
+
+            for index_name in self.INDEX_KEYS:
+                if index_name not in entry:
+                    self.__file_task(task, index_name)
+
+    def add_task(self, task):
+        """
+        Files a task under each of the indexes
+        """
+        self.entries[task.unique_id] = {}
+
+        for index_name in self.INDEX_KEYS:
+            self.__file_task(task, index_name)
+
+    def remove_task(self, task):
+        """
+        Removes a task from all of the indexes
+        """
+        for index_name in self.INDEX_KEYS:
+            self.__unfile_task(task, index_name)
+
+        del self.entries[task.unique_id]
+
+    def update_task(self, task, attribute):
+        """
+        Refiles a task under the indexes affected by a change to attribute
+        
+        Args:
+            task (Task): the task that changed
+            
+            attribute (str): the name of the task attribute that changed
+            
+        Returns:
+            None.
+        """
+        if task.unique_id not in self.entries:
+            return None
+
+        for index_name in self.INDEXES_FOR_ATTRIBUTE.get(attribute, ()):
+            self.__unfile_task(task, index_name)
+            self.__file_task(task, index_name)
+
+    def lookup(self, index_name, key):
+        """
+        Returns the set of unique IDs filed under key in the named index. The
+        set belongs to the index and must not be modified.
+        """
+        if (self.deferred_task_list is not None
+                and index_name not in self.HEADER_INDEX_KEYS):
+            self.__complete_deferred_indexes()
+
+        return self.indexes[index_name].get(key, frozenset())
+
+    def keys(self, index_name):
+        """
+        Returns every key the named index has tasks filed under
+        """
+        if (self.deferred_task_list is not None
+                and index_name not in self.HEADER_INDEX_KEYS):
+            self.__complete_deferred_indexes()
+
+        return list(self.indexes[index_name])
+
+    def __file_task(self, task, index_name):
+        """
+        Adds the task to the named index under its current keys
+        """
+        self.__file(task.unique_id, index_name,
+                    self.INDEX_KEYS[index_name](task))
+
+    def __file(self, unique_id, index_name, keys):
+        """
+        Adds the unique ID to the named index under each of the keys. A task
+        can be given the same project or context twice, so the keys are
+        filed once each.
+        """
+        index = self.indexes[index_name]
+        keys = tuple(dict.fromkeys(keys))
+
+        for key in keys:
+            index.setdefault(key, set()).add(unique_id)
+
+        self.entries[unique_id][index_name] = keys
+
+    def __unfile_task(self, task, index_name):
+        """
+        Removes the task from the named index, using the keys it was last
+        filed under
+        """
+        index = self.indexes[index_name]
+
+        for key in self.entries[task.unique_id].pop(index_name, ()):
+            unique_ids = index[key]
+            unique_ids.discard(task.unique_id)
+
+            if not unique_ids:
+                del index[key]
+
+
+class SubtaskTree():
+    """
+    The subtask relationships between tasks, held as the subtasks of each
+    task along with an index of the tasks each task is a subtask of, so
+    that the tree can be walked in either direction without scanning the
+    task list. Every walk is iterative and guards against cycles, so that
+    neither a deep tree nor a cycle saved by an older version can exhaust
+    the stack.
+    
+    Args:
+        None.
+    """
+
+    def __init__(self):
+        self.children = {}
+        self.parents = {}
+        self.deferred_task_list = None
+        self.deferred_positions = []
+
+    def rebuild(self, task_list):
+        """
+        Discards the tree and rebuilds it from the task list. Tasks in a
+        lazily loaded task list that aren't loaded yet are added from their
+        headers, without loading them. Only tasks saved before headers held
+        their subtasks are loaded, the first time the tree is used.
+        
+        Args:
+            task_list (list): all the tasks
+            
+        Returns:
+            None.
+        """
+        self.children = {}
+        self.parents = {}
+        self.deferred_task_list = None
+        self.deferred_positions = []
+
+        if not isinstance(task_list, LazyItemList):
+            for task in task_list:
+                self.add_task(task)
+
+            return None
+
+        for position, header in enumerate(task_list.headers):
+            if task_list.is_loaded(position):
+                self.add_task(task_list[position])
+            elif header.subtask_ids is None:
+                self.deferred_positions.append(position)
+            else:
+                self.__set_children(header.unique_id, header.subtask_ids)
+
+        if self.deferred_positions:
+            self.deferred_task_list = task_list
+
+    def __complete_deferred_tree(self):
+        """
+        Loads the tasks whose headers didn't hold their subtasks, to finish
+        the tree started by rebuild
+        """
+        if self.deferred_task_list is None:
+            return None
+
+        task_list = self.deferred_task_list
+        positions = self.deferred_positions
+        self.deferred_task_list = None
+        self.deferred_positions = []
+
+        for position in positions:
+            self.add_task(task_list[position])
+
+    def add_task(self, task):
+        """
+        Adds a task and its subtasks to the tree
+        """
+        self.__set_children(task.unique_id, task.subtask_ids)
+
+    def update_task(self, task, attribute):
+        """
+        Updates the tree after a change to attribute of task
+        
+        Args:
+            task (Task): the task that changed
+            
+            attribute (str): the name of the task attribute that changed
+            
+        Returns:
+            None.
+        """
+        if attribute == 'subtasks':
+            self.__set_children(task.unique_id, task.subtask_ids)
+
+    def __set_children(self, unique_id, children):
         """
-        self.task_manager.display_current_task()
-        return remaining_command
-        
-    def display_all(self, remaining_command):
+        Sets the subtasks of a task, keeping the parent index in step
+        """
+        previous_children = self.children.get(unique_id, ())
+
+        for child_id in set(previous_children).difference(children):
+            child_parents = self.parents[child_id]
+            child_parents.discard(unique_id)
+
+            if not child_parents:
+                del self.parents[child_id]
+
+        for child_id in set(children).difference(previous_children):
+            self.parents.setdefault(child_id, set()).add(unique_id)
+
+        if children:
+            self.children[unique_id] = tuple(children)
+        else:
+            self.children.pop(unique_id, None)
+
+    def children_of(self, unique_id):
         """
-        Displays all tasks in the task manager
+        Returns the unique IDs of the subtasks of a task, in order
         """
-        self.task_manager.display_all_tasks()
-        return remaining_command
+        self.__complete_deferred_tree()
+        return self.children.get(unique_id, ())
 
-    def set_due_date_current_task(self, new_due_date):
+    def parents_of(self, unique_id):
         """
-        Sets the due date/time on the current task
+        Returns the unique IDs of the tasks a task is a subtask of. The set
+        belongs to the tree and must not be modified.
         """
-        self.task_manager.modify_attribute_current_task('due', new_due_date)
+        self.__complete_deferred_tree()
+        return self.parents.get(unique_id, frozenset())
 
-    def edit_current_task(self, remaining_command):
+    def ancestors(self, unique_id):
         """
-        Edit the current command
+        Returns the unique IDs of every task a task is below, nearest first
         """
-        self.task_manager.edit_current_task()
-        return remaining_command
+        return self.__reachable(unique_id, self.parents_of)
 
-    def set_priority_current_task(self, new_priority):
+    def subtree(self, unique_id):
         """
-        Sets the priority on the current task
+        Returns the unique IDs of every task below a task, each once, in the
+        order walk reaches them
         """
-        self.task_manager.modify_attribute_current_task('priority', 
-                                                        new_priority)
+        subtree = []
+        seen = {unique_id}
 
-    def add_to_projects_current_task(self, new_project):
+        for parent_id, child_id in self.walk(unique_id):
+            if child_id not in seen:
+                seen.add(child_id)
+                subtree.append(child_id)
+
+        return subtree
+
+    def walk(self, unique_id, is_hidden=None):
         """
-        Adds to the projects list on the current task
+        Walks the tree below a task depth first, in the order the tasks are
+        displayed. A task that is a subtask of several tasks below this one
+        is reached once through each of them. A subtask that would close a
+        cycle, or that is more than MAX_DEPTH levels down, isn't followed.
+        
+        Args:
+            unique_id: the unique ID of the task at the top of the walk
+            
+            is_hidden (function): given a unique ID, whether to leave that
+                                  subtask and everything below it out of the
+                                  walk, defaults to None
+                                  
+        Yields:
+            tuple: the unique IDs of a task's parent on the way down and of
+                   the task itself
+        """
+        self.__complete_deferred_tree()
+
+        # Each entry is a task to visit, with the unique IDs on the path from
+        # the top of the walk down to it
+        stack = [(child_id, (unique_id,))
+                 for child_id in reversed(self.children_of(unique_id))]
+
+        while stack:
+            child_id, path = stack.pop()
+
+            if child_id in path or (is_hidden and is_hidden(child_id)):
+                continue
+
+            yield path[-1], child_id
+
+            if len(path) < MAX_DEPTH:
+                path = path + (child_id,)
+                stack.extend((grandchild_id, path) for grandchild_id
+                             in reversed(self.children_of(child_id)))
+
+    def depth(self, unique_id):
         """
-        self.task_manager.modify_attribute_current_task('projects',
-                                                        new_project)
-                      
-    def set_time_estimate_current_task(self, time_estimate):
+        Returns how many levels of tasks are above a task, at most one more
+        than MAX_DEPTH
         """
-        Sets the time estimate on the current task
+        return self.__levels(unique_id, self.parents_of)
+
+    def height(self, unique_id):
         """
-        self.task_manager.modify_attribute_current_task('time_estimate',
-                                                        time_estimate)
+        Returns how many levels of subtasks are below a task, at most one
+        more than MAX_DEPTH
+        """
+        return self.__levels(unique_id, self.children_of)
 
-    def set_time_spent_current_task(self, time_spent):
+    def check_subtask(self, unique_id, subtask_id):
         """
-        Sets the time spent on the current task
+        Checks that one task can be made a subtask of another
+        
+        Args:
+            unique_id: the unique ID of the task to add the subtask to
+            
+            subtask_id: the unique ID of the task to make a subtask
+            
+        Raises:
+            SubtaskError: if the task is already a subtask, would end up
+                          below itself, or would leave more than MAX_DEPTH
+                          levels of subtasks below any task
         """
-        self.task_manager.modify_attribute_current_task('time_spent', 
-                                                        time_spent)    
+        if subtask_id == unique_id:
+            raise SubtaskError("A task can't be a subtask of itself")
 
-    def make_subtask_of_current_task(self, subtask_index):
+        if subtask_id in self.children_of(unique_id):
+            raise SubtaskError("That task is already a subtask")
+
+        if subtask_id in self.ancestors(unique_id):
+            raise SubtaskError("That task is above this one, so making it a "
+                               "subtask would create a cycle")
+
+        if self.depth(unique_id) + 1 + self.height(subtask_id) > MAX_DEPTH:
+            raise SubtaskError("Subtasks can only be {} levels deep".format(
+                MAX_DEPTH))
+
+    @staticmethod
+    def __reachable(unique_id, neighbours_of):
         """
-        Adds the task with specified index as a subtask of the current 
-        task
+        Returns the unique IDs reachable from a task by repeatedly following
+        neighbours_of, breadth first and each once
         """
-        self.task_manager.modify_attribute_current_task('subtasks',
-            self.task_manager.return_task_with_index(subtask_index).unique_id)
-        
-    def set_current_task(self, index):
+        reachable = []
+        seen = {unique_id}
+        frontier = [unique_id]
+
+        while frontier:
+            next_frontier = []
+
+            for frontier_id in frontier:
+                for neighbour_id in neighbours_of(frontier_id):
+                    if neighbour_id not in seen:
+                        seen.add(neighbour_id)
+                        reachable.append(neighbour_id)
+                        next_frontier.append(neighbour_id)
+
+            frontier = next_frontier
+
+        return reachable
+
+    @staticmethod
+    def __levels(unique_id, neighbours_of):
         """
-        Sets the current task to the index specified
+        Returns the length of the longest chain of tasks reachable from a
+        task by repeatedly following neighbours_of, at most one more than
+        MAX_DEPTH so that a cycle still gives an answer
         """
-        self.task_manager.set_current_task(index)
+        levels = 0
+        frontier = {unique_id}
 
+        while levels <= MAX_DEPTH:
+            frontier = {neighbour_id for frontier_id in frontier
+                        for neighbour_id in neighbours_of(frontier_id)}
 
-class TaskManager():
+            if not frontier:
+                break
+
+            levels += 1
+
+        return levels
+
+
+class BlockerGraph():
     """
-    A class that handles a list of tasks in aggregate
+    The tasks each task is blocked behind, held as a directed acyclic graph
+    with an edge from each blocker to each task it blocks. The tasks each
+    task blocks are indexed too, so that closing a task only visits the
+    tasks blocked behind it. A closed task is removed from the blocked until
+    lists of its dependents, so each task's in-degree is the number of open
+    tasks it is still waiting on.
     
     Args:
-        task_list (list): a list of all the current tasks
+        None.
     """
+
     def __init__(self):
-        self.filehandler = FileHandler(config.task_file)
-        self.task_list = self.filehandler.parse_file()
-        self.current_task_index = 0
-        
-    def add_task(self, description):
-        """
-        Adds a task to the manager using the description
-        """
-        new_task = Task(description=description)
-        self.task_list.append(new_task)
-        self.current_task_index = len(self.task_list) - 1    
-        self.display_current_task()
-       
-    def display_task_by_index(self, task_index):
-        """
-        Displays a given task, along with all subtasks
+        self.blockers = {}
+        self.dependents = {}
+        self.deferred_task_list = None
+
+    def rebuild(self, task_list):
         """
-        table = PrettyTable(['Index'] + TASK_FIELDS)
-        table.align['Index'] = "l"
+        Discards the graph and rebuilds it from the task list. A lazily
+        loaded task list is only read the first time the graph is used.
         
-        task = self.return_task_with_index(task_index)
-        table.add_row([task_index] + task.attributes_as_list())
-        
-        self.__add_subtasks_to_table(str(task_index), task.subtasks, table)       
-        print(table)
+        Args:
+            task_list (list): all the tasks
             
-    def __add_subtasks_to_table(self, index_prefix, unique_id_string, table):
-        """
-        Adds the tasks on the unique_id_string (a comma separated list) to the
-        table, recursively allowing the presentation of subtasks
+        Returns:
+            None.
         """
-        if unique_id_string == 'None':
+        self.blockers = {}
+        self.dependents = {}
+        self.deferred_task_list = None
+
+        if isinstance(task_list, LazyItemList):
+            self.deferred_task_list = task_list
             return None
-        
-        unique_id_list = unique_id_string.split(',')
-        
-        for unique_id in unique_id_list:
-            task_index = self.return_index_for_unique_id(unique_id)
-            task = self.return_task_with_index(task_index)
-            
-            if task.state == 'closed':
-                continue
-            
-            table.add_row([index_prefix + "-" + str(task_index)]
-                          + task.attributes_as_list())
-                          
-            self.__add_subtasks_to_table(index_prefix + "-"
-                                         + str(task_index),
-                                         task.subtasks, table)
-            
-        return None
-        
-    def return_index_for_unique_id(self, unique_id):    
+
+        for task in task_list:
+            self.add_task(task)
+
+    def __complete_deferred_graph(self):
         """
-        Finds the current index of the task with the specified unique ID
+        Loads the tasks that could be blocked behind another, to build the
+        graph deferred by rebuild
         """
-        for task_index, task in enumerate(self.task_list):
-            if task.unique_id == unique_id:
-                return task_index
+        if self.deferred_task_list is None:
+            return None
 
-        return None
-       
-    def display_current_task(self):
+        task_list = self.deferred_task_list
+        self.deferred_task_list = None
+
+        for position, header in enumerate(task_list.headers):
+            # A task that wasn't blocked when it was saved can't be blocked
+            # behind another unless it has been loaded and changed since
+            if task_list.is_loaded(position) or header.blocked:
+                self.add_task(task_list[position])
+
+    def add_task(self, task):
         """
-        Displays the current task
+        Adds a task and the tasks it's blocked behind to the graph
         """
-        self.display_task_by_index(self.current_task_index)
-        
-    def display_all_tasks(self):
+        if self.deferred_task_list is not None:
+            # Built along with the rest of the task list when first used
+            return None
+
+        self.__set_blockers(task.unique_id, task.blocker_ids)
+
+    def update_task(self, task, attribute):
         """
-        Outputs a table showing all available tasks, sorted by index
+        Updates the graph after a change to attribute of task
         
         Args:
-            None.
+            task (Task): the task that changed
+            
+            attribute (str): the name of the task attribute that changed
             
         Returns:
             None.
         """
-        index_list = []
-        
-        for index, task in enumerate(self.task_list):
-            if task.state != 'closed':
-                index_list.append(index)
-        
-        self.display_list_of_tasks_by_index(index_list)
-                    
-    def display_list_of_tasks_by_index(self, index_list):
+        if attribute == 'blocked_until' and self.deferred_task_list is None:
+            self.__set_blockers(task.unique_id, task.blocker_ids)
+
+    def __set_blockers(self, unique_id, blockers):
         """
-        Displays the tasks with the indices specified by the list
-        
-        Args:
-            index_list (list): a list of task indices to display
-            
-        Returns:
-            None.
+        Sets the tasks a task is blocked behind, keeping the dependents index
+        in step
         """
-        for index, _ in enumerate(self.task_list):
-            if index in index_list:
-                self.display_task_by_index(index)
+        previous_blockers = self.blockers.get(unique_id, frozenset())
+        blockers = frozenset(blockers)
 
-    def modify_attribute_current_task(self, attribute, value):
+        for blocker_id in previous_blockers.difference(blockers):
+            blocker_dependents = self.dependents[blocker_id]
+            blocker_dependents.discard(unique_id)
+
+            if not blocker_dependents:
+                del self.dependents[blocker_id]
+
+        for blocker_id in blockers.difference(previous_blockers):
+            self.dependents.setdefault(blocker_id, set()).add(unique_id)
+
+        if blockers:
+            self.blockers[unique_id] = blockers
+        else:
+            self.blockers.pop(unique_id, None)
+
+    def blockers_of(self, unique_id):
         """
-        Sets the attribute on the currently active task to value.
-        
-        Args:
-            attribute (str): a string specifying the attribute 
-                             to modify
-                             
-            value: the new value
-        
-        Returns:
-            None.
+        Returns the unique IDs of the tasks a task is blocked behind
         """
-        setattr(self.task_list[self.current_task_index],
-                attribute,
-                value)    
-        
-    def return_task_with_index(self, index):  
+        self.__complete_deferred_graph()
+        return self.blockers.get(unique_id, frozenset())
+
+    def dependents_of(self, unique_id):
         """
-        Returns the task with the specified index
+        Returns the unique IDs of the tasks blocked behind a task. The set
+        belongs to the graph and must not be modified.
         """
-        return self.task_list[int(index)]  
-    
-    def set_current_task(self, index):
+        self.__complete_deferred_graph()
+        return self.dependents.get(unique_id, frozenset())
+
+    def in_degree(self, unique_id):
         """
-        Sets the current task index
+        Returns the number of open tasks a task is blocked behind
         """
-        self.current_task_index = int(index)
-        
-    def filter(self, only_active=True):
+        return len(self.blockers_of(unique_id))
+
+    def check_blocker(self, unique_id, blocker_id):
         """
-        Returns a filtered list of task indices
+        Checks that one task can be blocked behind another. Only the tasks
+        that are blocked, directly or not, behind the first task are visited.
         
         Args:
-            only_active (bool): only return those tasks which aren't blocked
+            unique_id: the unique ID of the task to block
             
-        Returns:
-            None.
-        """     
-        filtered_index_list = []
-        
-        for index, task in enumerate(self.task_list):
-            if (task.blocked_until == 'None'
-                and task.state != 'closed'
-                ):
-                filtered_index_list.append(index)
-                
-        return filtered_index_list
-        
-    def close(self):
-        """
-        Closes the task manager by writing the current state to file
+            blocker_id: the unique ID of the task to block it behind
+            
+        Raises:
+            BlockerError: if the task is already blocked behind the other,
+                          or would end up blocked behind itself
         """
-        self.filehandler.write_to_file(self.task_list)
+        if blocker_id == unique_id:
+            raise BlockerError("A task can't be blocked behind itself")
+
+        if blocker_id in self.blockers_of(unique_id):
+            raise BlockerError("This task is already blocked behind that one")
+
+        seen = {unique_id}
+        frontier = [unique_id]
+
+        while frontier:
+            dependent_id = frontier.pop()
+
+            for next_id in self.dependents_of(dependent_id):
+                if next_id == blocker_id:
+                    raise BlockerError("That task is blocked behind this one, "
+                                       "so it would create a cycle")
+
+                if next_id not in seen:
+                    seen.add(next_id)
+                    frontier.append(next_id)
 
 
 class Task():
     """
     A class representing a single task
+
+    Tasks are kept compact: attributes live in slots, the state is stored as
+    an index into TASK_STATES, dates as integer timestamps, the unique ID as
+    an integer and the list attributes as tuples, with project and context
+    names interned so each name is only held once.
     
     Args:
         description (str): the subject of the task
@@ -343,8 +1528,9 @@ class Task():
                             
         due (datetime): the date and time the task is due
         
-        blocked_until (list): a list of other tasks blocking this one, possibly
-                              also including a start date, defaults to an 
+        blocked_until (list): a list of the unique IDs of other tasks
+                              blocking this one, possibly also including a
+                              start date or other text, defaults to an 
                               empty list
                               
         time_estimate (str): the estimated time required for this task, defaults
@@ -358,56 +1544,127 @@ class Task():
         contexts (str): a list of contexts for this task, defaults to an empty
                         list
     """
+    __slots__ = ('listener', '_description', '_priority', '_created', '_due',
+                 '_blocked_until', '_time_estimate', '_time_spent',
+                 '_projects', '_contexts', '_state', '_unique_id',
+                 '_subtasks', '_row')
+
     def __init__(self, description, priority=3, created=None, due=None,
                  blocked_until=None, time_estimate=None, time_spent=None,
                  projects=None, contexts=None, state='open'):
                      
-        self.description = description
+        self.listener = None
+        
+        # The attributes formatted for display, kept until one changes
+        self._row = None
+
+        self._description = description
         
-        self._priority = priority
+        self._priority = int(priority)
         
         if not created:
-            self._created = datetime.now()
+            created = datetime.now()
             
-        self._due = due
+        self._created = self.datetime_to_timestamp(created)
         
-        if not blocked_until:
-            self._blocked_until = []
+        self._due = self.datetime_to_timestamp(due)
+
+        self._blocked_until = tuple(blocked_until or ())
             
         self._time_estimate = time_estimate
         
         self._time_spent = time_spent
         
-        if not projects:
-            self._projects = []
-        else:
-            self._projects = projects
+        self._projects = self.intern_all(projects or ())
         
-        if not contexts:
-            self._contexts = []
-        else:
-            self._contexts = contexts
+        self._contexts = self.intern_all(contexts or ())
             
-        self._state = state
+        self._state = TASK_STATES.index(state)
         
         self._unique_id = generate_unique_id()
         
-        self._subtasks = []
+        self._subtasks = ()
             
+    def __getstate__(self):
+        """
+        Returns the task's attributes as a tuple for pickling, excluding the
+        listener, which belongs to the task manager
+        """
+        return (self.description, self._priority, self._created, self._due,
+                self._blocked_until, self._time_estimate, self._time_spent,
+                self._projects, self._contexts, self._state,
+                self._unique_id, self._subtasks)
+
+    def __setstate__(self, state):
+        """
+        Restores a pickled task, which has no listener until a task manager
+        takes it on. Tasks pickled before tasks were made compact have their
+        attributes in a dictionary, and are converted here.
+        """
+        if isinstance(state, dict):
+            state = self.__convert_old_state(state)
+
+        (self._description, self._priority, self._created, self._due,
+         self._blocked_until, self._time_estimate, self._time_spent,
+         projects, contexts, self._state,
+         self._unique_id, self._subtasks) = state
+
+        self._projects = self.intern_all(projects)
+        self._contexts = self.intern_all(contexts)
+        self.listener = None
+        self._row = None
+
+    @classmethod
+    def __convert_old_state(cls, state):
+        """
+        Converts the attribute dictionary of a task pickled before tasks were
+        made compact into the current state tuple
+        """
+        def timestamp(value):
+            # Unparseable dates used to be stored as the string 'None'
+            if isinstance(value, datetime):
+                return cls.datetime_to_timestamp(value)
+
+            return None
+
+        return (state['description'],
+                int(state['_priority']),
+                timestamp(state.get('_created')),
+                timestamp(state['_due']),
+                tuple(state.get('_blocked_until', ())),
+                state['_time_estimate'],
+                state['_time_spent'],
+                tuple(state['_projects']),
+                tuple(state['_contexts']),
+                TASK_STATES.index(state['_state']),
+                normalise_unique_id(state['_unique_id']),
+                tuple(normalise_unique_id(unique_id)
+                      for unique_id in state['_subtasks']))
+
+    def _attribute_changed(self, attribute):
+        """
+        Tells the listener, if there is one, that an attribute has changed,
+        and discards the formatted attributes
+        """
+        self._row = None
+        
+        if self.listener is not None:
+            self.listener.task_changed(self, attribute)
+
     @staticmethod
-    def date_as_string(date_object):
+    def date_as_string(timestamp):
         """
-        Returns a given date object as a formatted string, or 'None'
-        if there is no object.
+        Returns a given timestamp as a formatted date string, or 'None'
+        if there is no timestamp.
         
         Args:
-            date_object (datetime): the datetime object to convert
+            timestamp (int): the timestamp to convert
             
         Returns:
-            str: the object converted into a string            
+            str: the timestamp converted into a string
         """
-        if date_object:
-            return date_object.strftime("%a %d %b %Y")
+        if timestamp is not None:
+            return datetime.fromtimestamp(timestamp).strftime("%a %d %b %Y")
         else:
             return 'None'
             
@@ -418,20 +1675,59 @@ class Task():
         or 'None' if the list is empty
                 
         Args:
-            list_object (list): the lsit to convert
+            list_object (list): the list to convert
             
         Returns:
             str: the object converted into a string            
         """
         if list_object:
-            return ",".join(list_object)
+            return ",".join(str(item) for item in list_object)
         else:
             return 'None'                    
       
     @staticmethod
-    def string_to_datetime(datetime_string):
+    def intern_all(names):
+        """
+        Returns a tuple of the names, interned so that tasks sharing a name
+        share a single string
+        """
+        return tuple(sys.intern(name) for name in names)
+
+    @staticmethod
+    def extended(tuple_object, value):
+        """
+        Returns tuple_object extended by value, which is either a single item
+        or a list of items
+        """
+        if type(value) == list:
+            return tuple_object + tuple(value)
+        else:
+            return tuple_object + (value,)
+
+    @staticmethod
+    def without(tuple_object, value):
+        """
+        Returns tuple_object with the first occurrence of value removed
+        """
+        position = tuple_object.index(value)
+        return tuple_object[:position] + tuple_object[position + 1:]
+
+    @staticmethod
+    def datetime_to_timestamp(datetime_object):
+        """
+        Converts a datetime object into an integer timestamp, or None if there
+        is no object
+        """
+        if datetime_object is None:
+            return None
+
+        return int(datetime_object.timestamp())
+
+    @classmethod
+    def string_to_timestamp(cls, datetime_string):
         """
-        Converts the specified string into a datetime object
+        Converts the specified string into an integer timestamp, or None if
+        it can't be parsed
         
         Args:
             datetime_string (str): the string to convert        
@@ -441,12 +1737,25 @@ class Task():
         
         for dt_format in datetime_formats:
             try:
-                return datetime.strptime(datetime_string, dt_format)
+                return cls.datetime_to_timestamp(
+                    datetime.strptime(datetime_string, dt_format))
             except ValueError:
                 continue
                 
         print("Value could not be parsed")                
-        return 'None'
+        return None
+
+    ############################################################################    
+    # Description
+    ############################################################################
+    @property
+    def description(self):
+        return self._description
+        
+    @description.setter
+    def description(self, value):
+        self._description = value
+        self._attribute_changed('description')
 
     ############################################################################    
     # Priority
@@ -458,6 +1767,7 @@ class Task():
     @priority.setter
     def priority(self, value):
         self._priority = int(value)
+        self._attribute_changed('priority')
         
     ############################################################################    
     # Created
@@ -468,7 +1778,8 @@ class Task():
         
     @created.setter
     def created(self, value):
-        self._created = self.string_to_datetime(value)
+        self._created = self.string_to_timestamp(value)
+        self._attribute_changed('created')
 
     ############################################################################    
     # Due
@@ -479,25 +1790,50 @@ class Task():
 
     @due.setter
     def due(self, value):
-        self._due = self.string_to_datetime(value)      
+        self._due = self.string_to_timestamp(value)
+        self._attribute_changed('due')
         
     ############################################################################    
     # Blocked until
     ############################################################################   
     @property
     def blocked_until(self):
-        return self.list_as_string(self._blocked_until)
+        return self.list_as_string([self.__describe_blocker(blocker)
+                                    for blocker in self._blocked_until])
 
     @blocked_until.setter
     def blocked_until(self, value):
-        if type(value) == list:
-            self._blocked_until.extend(value)
-        else:
-            self._blocked_until.append(value)
+        self._blocked_until = self.extended(self._blocked_until, value)
+        self._attribute_changed('blocked_until')
             
+    @property
+    def is_blocked(self):
+        return bool(self._blocked_until)
+
+    @property
+    def blocker_ids(self):
+        return tuple(blocker for blocker in self._blocked_until
+                     if isinstance(blocker, int))
+
+    def __describe_blocker(self, blocker):
+        """
+        Returns an entry in the blocked until list as it's displayed, which
+        for another task is its index
+        """
+        if not isinstance(blocker, int):
+            return blocker
+
+        index = None
+
+        if self.listener is not None:
+            index = self.listener.return_index_for_unique_id(blocker)
+
+        return 'task {}'.format('?' if index is None else index)
+
     def remove_blocked_until(self, value):
         if value in self._blocked_until:
-            self._blocked_until.remove(value)
+            self._blocked_until = self.without(self._blocked_until, value)
+            self._attribute_changed('blocked_until')
     
     ############################################################################    
     # Time estimate
@@ -509,6 +1845,7 @@ class Task():
     @time_estimate.setter
     def time_estimate(self, value):
         self._time_estimate = value
+        self._attribute_changed('time_estimate')
         
     ############################################################################    
     # Time spent
@@ -520,6 +1857,7 @@ class Task():
     @time_spent.setter
     def time_spent(self, value):
         self._time_spent = value
+        self._attribute_changed('time_spent')
 
     ############################################################################    
     # Projects
@@ -530,14 +1868,13 @@ class Task():
             
     @projects.setter
     def projects(self, value):
-        if type(value) == list:
-            self._projects.extend(value)
-        else:
-            self._projects.append(value)
+        self._projects = self.intern_all(self.extended(self._projects, value))
+        self._attribute_changed('projects')
             
     def remove_project(self, value):
         if value in self._projects:
-            self._projects.remove(value)
+            self._projects = self.without(self._projects, value)
+            self._attribute_changed('projects')
             
     ############################################################################    
     # Contexts
@@ -548,26 +1885,26 @@ class Task():
         
     @contexts.setter
     def contexts(self, value):
-        if type(value) == list:
-            self._contexts.extend(value)
-        else:
-            self._contexts.append(value)
+        self._contexts = self.intern_all(self.extended(self._contexts, value))
+        self._attribute_changed('contexts')
             
     def remove_context(self, value):
         if value in self._contexts:
-            self._contexts.remove(value)
+            self._contexts = self.without(self._contexts, value)
+            self._attribute_changed('contexts')
 
     ############################################################################    
     # State
     ############################################################################
     @property
     def state(self):
-        return self._state
+        return TASK_STATES[self._state]
         
     @state.setter
     def state(self, value):
-        if value in ['open', 'closed']:
-            self._state = value
+        if value in TASK_STATES:
+            self._state = TASK_STATES.index(value)
+            self._attribute_changed('state')
 
     ############################################################################    
     # Unique ID
@@ -585,31 +1922,38 @@ class Task():
     
     @subtasks.setter
     def subtasks(self, value):
-        if type(value) == list:
-            self._subtasks.extend(value)
-        else:
-            self._subtasks.append(value)      
+        self._subtasks = self.extended(self._subtasks, value)
+        self._attribute_changed('subtasks')
             
+    @property
+    def subtask_ids(self):
+        return self._subtasks
+
     def remove_subtask(self, value):
         if value in self._subtasks:
-            self._subtasks.remove(value)
+            self._subtasks = self.without(self._subtasks, value)
+            self._attribute_changed('subtasks')
 
     ############################################################################    
 
     def attributes_as_list(self):
         """
         Returns all the attributes of the task as a list, typically for 
-        printing so it's important the order matches TASK_FIELDS above.      
-        """
-        return [self.description,
-                self.priority,
-                self.created,
-                self.due,
-                self.blocked_until,
-                self.time_estimate,
-                self.time_spent,
-                self.projects,
-                self.contexts]
+        printing so it's important the order matches TASK_FIELDS above. They
+        are only formatted again after one of them changes.
+        """
+        if self._row is None:
+            self._row = (self.description,
+                         self.priority,
+                         self.created,
+                         self.due,
+                         self.blocked_until,
+                         self.time_estimate,
+                         self.time_spent,
+                         self.projects,
+                         self.contexts)
+                         
+        return list(self._row)
 
     def display(self, index=None):
         """
@@ -0,0 +1,456 @@
+from storage import LazyItemList
+
+try:
+    import numpy
+except ImportError:
+    # The columnar store is optional, and unavailable without NumPy
+    numpy = None
+
+# Stands in for a missing timestamp in the created and due columns
+MISSING_TIMESTAMP = -2 ** 63
+
+
+def columnar_store_available():
+    """
+    Returns whether NumPy is installed, without which there is no columnar
+    store
+    """
+    return numpy is not None
+
+
+class Vocabulary():
+    """
+    Assigns each distinct name a small integer code, in the order the names
+    are first seen
+
+    Args:
+        None.
+    """
+
+    def __init__(self):
+        self.codes = {}
+        self.names = []
+
+    def __len__(self):
+        return len(self.names)
+
+    def code(self, name):
+        """
+        Returns the code for name, assigning a new one if it hasn't been seen
+        """
+        code = self.codes.get(name)
+
+        if code is None:
+            code = len(self.names)
+            self.codes[name] = code
+            self.names.append(name)
+
+        return code
+
+    def lookup(self, name):
+        """
+        Returns the code for name, or None if it hasn't been seen
+        """
+        return self.codes.get(name)
+
+
+class MembershipColumn():
+    """
+    An integer coded column for an attribute holding several names per task,
+    such as projects. Row r, column c of the matrix is True when task r has
+    the name with code c.
+
+    Args:
+        capacity (int): the number of rows to allocate to start with
+    """
+
+    def __init__(self, capacity):
+        self.vocabulary = Vocabulary()
+        self.matrix = numpy.zeros((capacity, 8), dtype=bool)
+
+    def grow_rows(self, capacity):
+        """
+        Makes room for at least capacity rows
+        """
+        if capacity > self.matrix.shape[0]:
+            matrix = numpy.zeros((capacity, self.matrix.shape[1]), dtype=bool)
+            matrix[:self.matrix.shape[0]] = self.matrix
+            self.matrix = matrix
+
+    def set_row(self, row, names):
+        """
+        Records that the task in row has exactly the given names
+        """
+        codes = [self.vocabulary.code(name) for name in names]
+
+        if len(self.vocabulary) > self.matrix.shape[1]:
+            matrix = numpy.zeros((self.matrix.shape[0],
+                                  2 * len(self.vocabulary)), dtype=bool)
+            matrix[:, :self.matrix.shape[1]] = self.matrix
+            self.matrix = matrix
+
+        self.matrix[row] = False
+        self.matrix[row, codes] = True
+
+    def mask(self, name, size):
+        """
+        Returns a boolean array over the first size rows, True for the tasks
+        that have the name
+        """
+        code = self.vocabulary.lookup(name)
+
+        if code is None:
+            return numpy.zeros(size, dtype=bool)
+
+        return self.matrix[:size, code]
+
+    def counts(self, size, rows=None):
+        """
+        Returns the number of tasks with each name, over the first size rows
+        or only the rows selected by a boolean array
+        """
+        matrix = self.matrix[:size]
+
+        if rows is not None:
+            matrix = matrix[rows]
+
+        totals = matrix.sum(axis=0)
+
+        return {name: int(totals[code])
+                for code, name in enumerate(self.vocabulary.names)
+                if totals[code]}
+
+
+class TaskStore():
+    """
+    A columnar copy of the task attributes that filters, sorts and counts
+    work on, held in NumPy arrays so that they run as vectorised operations
+    over the whole task list rather than task by task. Row r of every column
+    describes the task at index r of the task list. Like the TaskIndex, the
+    store can be kept up to date as tasks change, through add_task and
+    update_task.
+
+    Tasks in a lazily loaded task list that aren't loaded yet are stored from
+    their headers, and the columns that need more than a header are only
+    completed the first time they are used.
+
+    Args:
+        capacity (int): the number of rows to allocate to start with,
+                        defaults to 1024
+    """
+    # The columns that can be filled from a stored task's header
+    HEADER_COLUMNS = ('state', 'priority', 'blocked')
+
+    # Which columns need updating when a given task attribute changes
+    COLUMNS_FOR_ATTRIBUTE = {
+        'state': ('state',),
+        'priority': ('priority',),
+        'created': ('created',),
+        'due': ('due',),
+        'blocked_until': ('blocked',),
+        'projects': ('projects',),
+        'contexts': ('contexts',),
+        }
+
+    # The columns listings can be sorted by
+    SORT_COLUMNS = ('priority', 'created', 'due')
+
+    def __init__(self, capacity=1024):
+        self.size = 0
+        self.states = Vocabulary()
+        self.deferred_task_list = None
+        self.__allocate(capacity)
+
+    def __allocate(self, capacity):
+        """
+        Discards all rows and allocates empty columns with room for capacity
+        rows
+        """
+        self.state = numpy.zeros(capacity, dtype=numpy.int8)
+        self.priority = numpy.zeros(capacity, dtype=numpy.int16)
+        self.created = numpy.full(capacity, MISSING_TIMESTAMP,
+                                  dtype=numpy.int64)
+        self.due = numpy.full(capacity, MISSING_TIMESTAMP, dtype=numpy.int64)
+        self.blocked = numpy.zeros(capacity, dtype=bool)
+        self.projects = MembershipColumn(capacity)
+        self.contexts = MembershipColumn(capacity)
+
+    def __grow(self, capacity):
+        """
+        Makes room for at least capacity rows, doubling the columns so that
+        adding tasks one at a time takes amortised constant time
+        """
+        if capacity <= len(self.state):
+            return None
+
+        capacity = max(capacity, 2 * len(self.state))
+
+        for name, fill in (('state', 0), ('priority', 0),
+                           ('created', MISSING_TIMESTAMP),
+                           ('due', MISSING_TIMESTAMP), ('blocked', False)):
+            column = getattr(self, name)
+            grown = numpy.full(capacity, fill, dtype=column.dtype)
+            grown[:len(column)] = column
+            setattr(self, name, grown)
+
+        self.projects.grow_rows(capacity)
+        self.contexts.grow_rows(capacity)
+
+    def rebuild(self, task_list):
+        """
+        Discards all rows and refills the columns from the task list
+
+        Args:
+            task_list (list): all the tasks, in index order
+
+        Returns:
+            None.
+        """
+        self.size = len(task_list)
+        self.deferred_task_list = None
+        self.__allocate(max(self.size, 1024))
+
+        if not isinstance(task_list, LazyItemList):
+            for row, task in enumerate(task_list):
+                self.__set_row(row, task)
+
+            return None
+
+        for row, header in enumerate(task_list.headers):
+            if task_list.is_loaded(row):
+                self.__set_row(row, task_list[row])
+            else:
+                self.__set_header_row(row, header)
+
+        self.deferred_task_list = task_list
+
+    def add_task(self, task):
+        """
+        Appends a row for a task added to the end of the task list
+        """
+        self.__grow(self.size + 1)
+        self.size += 1
+        self.__set_row(self.size - 1, task)
+
+    def update_task(self, row, task, attribute):
+        """
+        Refreshes the columns affected by a change to attribute
+
+        Args:
+            row (int): the task's index in the task list
+
+            task (Task): the task that changed
+
+            attribute (str): the name of the task attribute that changed
+
+        Returns:
+            None.
+        """
+        for column in self.COLUMNS_FOR_ATTRIBUTE.get(attribute, ()):
+            self.__set_column(row, task, column)
+
+    def __set_row(self, row, task):
+        """
+        Fills every column of a row from a task
+        """
+        for column in ('state', 'priority', 'created', 'due', 'blocked',
+                       'projects', 'contexts'):
+            self.__set_column(row, task, column)
+
+    def __set_column(self, row, task, column):
+        """
+        Fills a single column of a row from a task
+        """
+        if column == 'state':
+            self.state[row] = self.states.code(task.state)
+        elif column == 'priority':
+            self.priority[row] = task._priority
+        elif column == 'created':
+            self.created[row] = self.__timestamp(task._created)
+        elif column == 'due':
+            self.due[row] = self.__timestamp(task._due)
+        elif column == 'blocked':
+            self.blocked[row] = task.is_blocked
+        elif column == 'projects':
+            self.projects.set_row(row, task._projects)
+        elif column == 'contexts':
+            self.contexts.set_row(row, task._contexts)
+
+    def __set_header_row(self, row, header):
+        """
+        Fills the columns that can be filled from a stored task's header
+        """
+        self.state[row] = self.states.code(header.state)
+        self.priority[row] = header.priority
+        self.blocked[row] = bool(header.blocked)
+
+    @staticmethod
+    def __timestamp(timestamp):
+        return MISSING_TIMESTAMP if timestamp is None else timestamp
+
+    def __complete_deferred_columns(self):
+        """
+        Loads every task, to fill the columns that couldn't be filled from
+        their headers
+        """
+        task_list = self.deferred_task_list
+        self.deferred_task_list = None
+
+        for row, task in enumerate(task_list):
+            for column in ('created', 'due', 'projects', 'contexts'):
+                self.__set_column(row, task, column)
+
+    def __columns_needed(self, columns):
+        """
+        Completes the deferred columns if any of columns is one of them
+        """
+        if (self.deferred_task_list is not None
+                and not set(columns).issubset(self.HEADER_COLUMNS)):
+            self.__complete_deferred_columns()
+
+    def mask(self, only_active=True, state=None, priority=None,
+             project=None, context=None):
+        """
+        Returns a boolean array over the task list, True for the tasks that
+        match all of the criteria. The arguments are as for filter.
+        """
+        columns = []
+
+        if project is not None:
+            columns.append('projects')
+
+        if context is not None:
+            columns.append('contexts')
+
+        self.__columns_needed(columns)
+
+        size = self.size
+        mask = numpy.ones(size, dtype=bool)
+
+        if only_active:
+            closed = self.states.lookup('closed')
+
+            if closed is not None:
+                mask &= self.state[:size] != closed
+
+            mask &= ~self.blocked[:size]
+
+        if state is not None:
+            code = self.states.lookup(state)
+
+            if code is None:
+                return numpy.zeros(size, dtype=bool)
+
+            mask &= self.state[:size] == code
+
+        if priority is not None:
+            mask &= self.priority[:size] == int(priority)
+
+        if project is not None:
+            mask &= self.projects.mask(project, size)
+
+        if context is not None:
+            mask &= self.contexts.mask(context, size)
+
+        return mask
+
+    def filter(self, only_active=True, state=None, priority=None,
+               project=None, context=None):
+        """
+        Returns a filtered list of task indices, found by vectorised
+        comparisons over the columns
+
+        Args:
+            only_active (bool): only return those tasks which are open and
+                                aren't blocked
+
+            state (str): only return tasks in this state, defaults to None
+
+            priority (int): only return tasks with this priority, defaults
+                            to None
+
+            project (str): only return tasks in this project, defaults to
+                           None
+
+            context (str): only return tasks with this context, defaults to
+                           None
+
+        Returns:
+            list: the indices of the matching tasks, in index order
+        """
+        return numpy.flatnonzero(self.mask(only_active, state, priority,
+                                           project, context)).tolist()
+
+    def count(self, **criteria):
+        """
+        Returns the number of tasks matching the criteria, which are as for
+        filter
+        """
+        return int(numpy.count_nonzero(self.mask(**criteria)))
+
+    def sort(self, index_list, column, descending=False):
+        """
+        Sorts task indices by one of the SORT_COLUMNS. Ties keep their order
+        in index_list, and tasks without a date sort last.
+
+        Args:
+            index_list (list): the task indices to sort
+
+            column (str): the name of the column to sort by
+
+            descending (bool): whether to sort largest first, defaults to
+                               False
+
+        Returns:
+            list: the sorted task indices
+        """
+        if column not in self.SORT_COLUMNS:
+            raise ValueError("Can't sort by " + str(column))
+
+        self.__columns_needed([column])
+
+        rows = numpy.asarray(index_list, dtype=numpy.int64)
+        keys = getattr(self, column)[rows].astype(numpy.int64)
+
+        if column == 'priority':
+            missing = numpy.zeros(len(rows), dtype=bool)
+        else:
+            missing = keys == MISSING_TIMESTAMP
+
+        if descending:
+            keys = numpy.where(missing, 0, -keys)
+
+        # lexsort is stable and sorts by its last key first, so tasks without
+        # a date go last whichever way the list is sorted
+        order = numpy.lexsort((keys, missing))
+
+        return rows[order].tolist()
+
+    def counts_by(self, column, **criteria):
+        """
+        Returns the number of tasks matching the criteria with each value of
+        a column
+
+        Args:
+            column (str): 'state', 'priority', 'projects' or 'contexts'
+
+            **criteria: as for filter
+
+        Returns:
+            dict: the number of matching tasks for each value
+        """
+        self.__columns_needed([column])
+        rows = self.mask(**criteria)
+
+        if column in ('projects', 'contexts'):
+            return getattr(self, column).counts(self.size, rows)
+
+        values, totals = numpy.unique(getattr(self, column)[:self.size][rows],
+                                      return_counts=True)
+
+        if column == 'state':
+            values = [self.states.names[value] for value in values]
+        else:
+            values = values.tolist()
+
+        return dict(zip(values, totals.tolist()))
@@ -0,0 +1,94 @@
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import unittest
+
+# The config names the data files after the home directory when it's
+# imported, so they end up alongside it, in DIRECTORY
+DIRECTORY = tempfile.mkdtemp()
+os.environ['HOME'] = os.path.join(DIRECTORY, 'home')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tasks import TaskCommandHandler
+
+
+class TaskCommandTestCase(unittest.TestCase):
+    """
+    Runs task commands against three new tasks
+    """
+
+    def setUp(self):
+        for filename in os.listdir(DIRECTORY):
+            os.remove(os.path.join(DIRECTORY, filename))
+
+        self.handler = TaskCommandHandler()
+        self.task_list = self.handler.task_manager.task_list
+
+        for description in ('one', 'two', 'three'):
+            self.run_commands('a ' + description)
+
+    def run_commands(self, *commands):
+        """
+        Runs each command in turn, returning what they print
+        """
+        output = io.StringIO()
+
+        with contextlib.redirect_stdout(output):
+            for command in commands:
+                self.handler.handle_command(command)
+
+        return output.getvalue()
+
+
+class BulkCommandTests(TaskCommandTestCase):
+    """
+    Runs task commands that may apply to several tasks at once
+    """
+
+    def test_free_text_containing_where_is_kept(self):
+        self.run_commands('sc 0', 'co somewhere where it is')
+
+        self.assertEqual(self.task_list[0].contexts, 'somewhere where it is')
+        self.assertEqual([task.contexts for task in self.task_list[1:]],
+                         ['None', 'None'])
+
+    def test_where_after_arguments_applies_to_query_results(self):
+        self.run_commands('sc 1', 'pr Foo', 'p 1 where project:Foo')
+
+        self.assertEqual([task.priority for task in self.task_list],
+                         ['3', '1', '3'])
+
+    def test_range_and_bracketed_query(self):
+        self.run_commands('sc 0-1 p 2', 'sc (priority=2) c')
+
+        self.assertEqual([task.state for task in self.task_list],
+                         ['closed', 'closed', 'open'])
+
+    def test_current_task_is_left_alone(self):
+        self.run_commands('sc 2', 'sc 0,1 p 1')
+
+        self.assertEqual(self.handler.task_manager.current_task_index, 2)
+
+
+class TaskIndexTests(TaskCommandTestCase):
+    """
+    Checks that the task index keeps up with changes made by commands
+    """
+
+    def test_repeated_project_and_context(self):
+        output = self.run_commands('sc 0', 'pr Foo', 'pr Foo', 'pr Bar',
+                                   'co x', 'co x', 'co y')
+        task_manager = self.handler.task_manager
+
+        self.assertNotIn('exception', output)
+        self.assertNotIn('Command not found', output)
+        self.assertEqual(task_manager.filter(project='Foo'), [0])
+        self.assertEqual(task_manager.filter(project='Bar'), [0])
+        self.assertEqual(task_manager.filter(context='y'), [0])
+        self.assertEqual(self.task_list[0].contexts, 'x,x,y')
+
+
+if __name__ == '__main__':
+    unittest.main()
\ No newline at end of file
@@ -8,6 +8,26 @@ def generate_unique_id():
         None.
     
     Returns:
-        str: the unique identifier as a string
+        int: the unique identifier as a 128 bit integer
     """
-    return str(uuid.uuid4())
\ No newline at end of file
+    return uuid.uuid4().int
+
+def normalise_unique_id(unique_id):
+    """
+    Converts a unique ID in any of the forms it has been stored in to the
+    current integer form
+    
+    Args:
+        unique_id (int or str): the unique ID, either already an integer, an
+                                integer as a string, or a UUID string
+    
+    Returns:
+        int: the unique identifier as a 128 bit integer
+    """
+    if isinstance(unique_id, int):
+        return unique_id
+    
+    if '-' in unique_id:
+        return uuid.UUID(unique_id).int
+    
+    return int(unique_id)
\ No newline at end of file